@@ -0,0 +1,226 @@
+"""Headless chart rendering for the S.A.R.A.L app.
+
+Figures are drawn in worker processes so matplotlib never runs on (or holds
+the GIL of) the Streamlit server process. Renderers take plain Python data —
+lists, strings, numbers — and return image bytes; register new ones in
+RENDERERS. This module must stay importable without Streamlit, since spawned
+workers import it on their own.
+"""
+import hashlib
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import numpy as np
+
+
+class RenderQueueFull(RuntimeError):
+    """Raised by ChartRenderPool.submit() when max_pending renders are queued."""
+
+
+# =========================================================================
+# RENDERERS
+# =========================================================================
+def draw_pie_breakdown(major, table_rows, group_col, chart_title, caption_parts, fmt="png"):
+    """Pie chart with leader lines + labels, and a counts table on the right,
+    rendered to `fmt` bytes on a standalone Agg figure (no pyplot state).
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    base_colors = [
+        "#4E79A7", "#F28E2B", "#E15759", "#76B7B2", "#59A14F",
+        "#EDC948", "#B07AA1", "#FF9DA7", "#9C755F", "#BAB0AC",
+        "#1F77B4", "#FF7F0E", "#2CA02C", "#D62728", "#9467BD",
+        "#8C564B", "#E377C2", "#7F7F7F", "#BCBD22", "#17BECF",
+    ]
+    colors = [base_colors[i % len(base_colors)] for i in range(len(major))]
+
+    # Layout: pie left (with room for labels), table right
+    fig = Figure(figsize=(12, 5.5), facecolor="white")
+    FigureCanvasAgg(fig)
+    ax_pie = fig.add_axes([0.02, 0.12, 0.50, 0.78])
+    ax_tbl = fig.add_axes([0.58, 0.10, 0.40, 0.80])
+    ax_tbl.axis("off")
+
+    wedges, texts, autotexts = ax_pie.pie(
+        [count for _, count in major],
+        colors=colors,
+        startangle=90,
+        autopct="%1.1f%%",
+        pctdistance=0.55,
+        textprops=dict(color="black", fontsize=8),
+        wedgeprops=dict(edgecolor="white", linewidth=1.2),
+    )
+    for t in autotexts:
+        t.set_fontsize(8)
+        t.set_fontweight("bold")
+
+    # Leader lines + labels — alternate left/right around the pie
+    for wedge, (name, count) in zip(wedges, major):
+        ang = (wedge.theta2 + wedge.theta1) / 2.0
+        x = np.cos(np.deg2rad(ang))
+        y = np.sin(np.deg2rad(ang))
+
+        # Prefer left side for labels so they stay away from the table
+        # but allow right-side labels only for slices clearly on the right
+        # and keep them close to the pie (short lines)
+        if x >= 0:
+            lx = 1.25
+            ha = "left"
+        else:
+            lx = -1.25
+            ha = "right"
+        ly = 1.15 * y
+
+        label = f"{name} ({count})"
+        ax_pie.annotate(
+            label,
+            xy=(0.92 * x, 0.92 * y),
+            xytext=(lx, ly),
+            ha=ha,
+            va="center",
+            fontsize=8,
+            bbox=dict(boxstyle="round,pad=0.25", facecolor="white", edgecolor="#AAAAAA", alpha=0.9),
+            arrowprops=dict(arrowstyle="-", color="#555555", lw=0.8,
+                            connectionstyle="arc3,rad=0"),
+        )
+
+    ax_pie.set_xlim(-1.7, 1.7)
+    ax_pie.set_ylim(-1.5, 1.5)
+    ax_pie.set_aspect("equal")
+
+    # Table
+    col_labels = [group_col, "Count"]
+    table = ax_tbl.table(
+        cellText=table_rows,
+        colLabels=col_labels,
+        loc="center",
+        cellLoc="left",
+    )
+    table.auto_set_font_size(False)
+    table.set_fontsize(9)
+    table.scale(1.05, 1.5)
+
+    n_data = len(table_rows) - 1  # exclude TOTAL
+    for j in range(2):
+        cell = table[(0, j)]
+        cell.set_facecolor("#1F4E79")
+        cell.set_text_props(color="white", fontweight="bold", fontsize=9, ha="center")
+
+    for i in range(1, n_data + 1):
+        alt = "#F5F7FA" if i % 2 == 0 else "#FFFFFF"
+        table[(i, 0)].set_facecolor(alt)
+        table[(i, 0)].set_text_props(ha="left", fontsize=9)
+        table[(i, 1)].set_facecolor(alt)
+        table[(i, 1)].set_text_props(ha="center", fontsize=9)
+
+    # TOTAL
+    last = n_data + 1
+    for j in range(2):
+        table[(last, j)].set_facecolor("#E8F0FE")
+        table[(last, j)].set_text_props(fontweight="bold", fontsize=9,
+                                        ha="center" if j == 1 else "left")
+
+    for i in range(last + 1):
+        table[(i, 0)].set_width(0.70)
+        table[(i, 1)].set_width(0.30)
+
+    for _k, cell in table.get_celld().items():
+        cell.set_edgecolor("#D0D7DE")
+        cell.set_linewidth(0.6)
+
+    fig.suptitle(chart_title, fontsize=14, fontweight="bold", y=0.97, color="#1A1A1A")
+    fig.text(0.5, 0.02, " | ".join(caption_parts), ha="center", fontsize=7.5, color="#666666")
+
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt, dpi=160, bbox_inches="tight", facecolor="white")
+    return buf.getvalue()
+
+
+RENDERERS = {
+    "pie_breakdown": draw_pie_breakdown,
+}
+
+
+def render(kind, kwargs):
+    """Worker entry point: draw chart `kind` from plain `kwargs`."""
+    return RENDERERS[kind](**kwargs)
+
+
+# =========================================================================
+# POOL
+# =========================================================================
+class ChartRenderPool:
+    """Process pool of headless chart renderers with a shared result cache.
+
+    Charts are keyed by a hash of the renderer name and everything passed to
+    it. A request for a chart that is already being drawn gets the same
+    future, so a breakdown many users are looking at is drawn once, and
+    finished charts are kept in a small LRU. At most `max_pending` renders
+    may be queued or running; beyond that submit() raises RenderQueueFull
+    instead of letting the backlog grow. Callers bound their wait with
+    future.result(timeout=...).
+    """
+
+    def __init__(self, workers=2, max_pending=8, cache_entries=64):
+        self.workers = workers
+        self.cache_entries = cache_entries
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._done = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @staticmethod
+    def key(kind, kwargs):
+        payload = json.dumps([kind, kwargs], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _finished(self, key, future):
+        self._slots.release()
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                if isinstance(future.exception(), BrokenProcessPool):
+                    self._pool = None  # a worker died; start a fresh pool next time
+                return
+            self._done[key] = future.result()
+            while len(self._done) > self.cache_entries:
+                self._done.popitem(last=False)
+
+    def submit(self, kind, **kwargs):
+        """Future for the bytes of chart `kind` drawn from `kwargs`."""
+        key = self.key(kind, kwargs)
+        with self._lock:
+            data = self._done.get(key)
+            if data is not None:
+                self._done.move_to_end(key)
+                future = Future()
+                future.set_result(data)
+                return future
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            if not self._slots.acquire(blocking=False):
+                raise RenderQueueFull(f"{len(self._inflight)} charts already rendering")
+            try:
+                future = self._executor().submit(render, kind, kwargs)
+            except Exception:
+                self._slots.release()
+                self._pool = None
+                raise
+            self._inflight[key] = future
+        future.add_done_callback(lambda f, key=key: self._finished(key, f))
+        return future
@@ -1,25 +1,39 @@
 #inspectionviewer
+import time
+_SCRIPT_START = time.perf_counter()
 import streamlit as st
 import pandas as pd
 import gspread
+from gspread.http_client import HTTPClient
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession
+import requests
+from requests.adapters import HTTPAdapter
 from io import BytesIO
-from matplotlib import pyplot as plt
-import altair as alt
 import random
 import string
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
-from openpyxl.styles import Alignment, Font, Border, Side, NamedStyle
 from pandas.api.types import is_numeric_dtype, is_datetime64_any_dtype
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
-from st_aggrid.shared import JsCode
 import pytz
 from datetime import datetime, date, timedelta
 from urllib.parse import quote
 import re
-import plotly.express as px
-import plotly.graph_objects as go
+import json
+import csv
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+import functools
+import sys
+import importlib
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from itertools import repeat
+from chart_renderer import ChartRenderPool, RenderQueueFull
 # =========================================================================
 # CONFIG
 # =========================================================================
@@ -39,6 +53,24 @@ TIMESTAMP_COL_NAME = "Timestamp of Compliance"
 _gs_secrets = st.secrets.get("google_sheets", {})
 INSPECTIONS_SHEET_ID = _gs_secrets.get("ins_sheet_id")
 INSPECTIONS_SHEET_NAME = _gs_secrets.get("ins_sheet_name")
+# Shared Sheets client (see PooledSheetsHTTPClient): max in-flight API calls
+# for the whole process, and retry policy for 429 / 5xx responses.
+SHEETS_MAX_CONCURRENCY = int(_gs_secrets.get("max_concurrency", 8))
+SHEETS_MAX_RETRIES = int(_gs_secrets.get("max_retries", 5))
+SHEETS_RETRY_BASE_SECONDS = 1.0
+SHEETS_RETRY_MAX_SECONDS = 32.0
+# Storage behind get_sheets_client(): "google" (the live API) or "local", an
+# SQLite stand-in for offline development and load tests (see LocalSheetsBackend).
+_backend_secrets = st.secrets.get("sheets_backend", {})
+SHEETS_BACKEND = _backend_secrets.get("kind", "google")
+LOCAL_SHEETS_DB_PATH = _backend_secrets.get("db_path", "local_sheets.db")
+# Optional folder of "<sheet name>.csv" files copied into a worksheet the first time it is opened.
+LOCAL_SHEETS_SEED_DIR = _backend_secrets.get("seed_dir")
+LOCAL_SHEETS_LATENCY_SECONDS = float(_backend_secrets.get("latency_ms", 0)) / 1000
+LOCAL_SHEETS_JITTER_SECONDS = float(_backend_secrets.get("jitter_ms", 0)) / 1000
+# Share of calls answered with a synthetic 429, to exercise the retry paths.
+LOCAL_SHEETS_429_RATE = float(_backend_secrets.get("error_429_rate", 0.0))
+LOCAL_SHEETS_RANDOM_SEED = _backend_secrets.get("random_seed")
 # Field name -> 0-indexed column position (A=0, B=1, C=2, ...) as specified.
 INSPECTIONS_COL_MAP = {
     "Name": 1,           # Column B - Inspecting Official's name
@@ -51,6 +83,34 @@ INSPECTIONS_COL_MAP = {
     "ActionBy": 11,           # Column L - Action By
 }
 
+# ---- Status classification memo (see ClassificationCache) ----
+_cache_secrets = st.secrets.get("cache", {})
+CLASSIFICATION_CACHE_SIZE = int(_cache_secrets.get("classification_entries", 200_000))
+# Optional SQLite file so a restarted container starts with a warm memo.
+CLASSIFICATION_CACHE_PATH = _cache_secrets.get("classification_db")
+
+# ---- Incremental sync of the main deficiency sheet (see DeficiencySheetSync) ----
+# Columns the app itself edits; these are re-read on every delta sync.
+SYNC_MUTABLE_COLS = ["Head", "Sub Head", "Action By", "Feedback", "User Feedback/Remark", TIMESTAMP_COL_NAME]
+# Columns that never change once a row is written. Together they identify a
+# row (many rows share a date); if any row's combination moves, rows were
+# inserted/deleted in the sheet and the snapshot is rebuilt in full.
+SYNC_IDENTITY_COLS = ["Date of Inspection", "Location", "Deficiencies Noted"]
+SYNC_FULL_RESYNC_SECONDS = 600
+# Parquet copy of the last built deficiency table plus a "<path>.json" version
+# sidecar, served on startup while the first sync runs in the background
+# (see SnapshotStore). An empty path disables it.
+SNAPSHOT_CACHE_PATH = _cache_secrets.get("snapshot_parquet", "deficiency_snapshot.parquet")
+# Bump when build_deficiency_frame() changes shape so old files are ignored.
+SNAPSHOT_CACHE_SCHEMA = 1
+
+# ---- Write-behind queue for feedback submissions (see FeedbackWriteQueue) ----
+_writes_secrets = st.secrets.get("writes", {})
+# SQLite journal of unfinished submissions, replayed after a restart.
+WRITE_JOURNAL_PATH = _writes_secrets.get("journal_db", "feedback_write_journal.db")
+WRITE_COALESCE_SECONDS = float(_writes_secrets.get("coalesce_seconds", 0.5))
+WRITE_RETRY_MAX_SECONDS = 120.0
+
 # Characters used for the CAPTCHA text. Visually-confusable characters
 # (0/O, 1/I/l) are excluded so a genuine human isn't penalised for a
 # reasonable misread.
@@ -58,6 +118,56 @@ CAPTCHA_CHARS = "".join(c for c in (string.ascii_uppercase + string.digits) if c
 CAPTCHA_LENGTH = 5
 CAPTCHA_MAX_ATTEMPTS = 5  # lock out after this many wrong CAPTCHA attempts in a session
 
+# ---- Startup profile (sidebar expander, off unless enabled in secrets) ----
+SHOW_STARTUP_PROFILE = bool(st.secrets.get("debug", {}).get("startup_profile", False))
+# Dependencies whose cold import time the profile measures, heaviest users first.
+PROFILED_IMPORTS = [
+    "streamlit", "pandas", "numpy", "gspread", "google.oauth2.service_account", "PIL.Image",
+    "pytz", "openpyxl", "st_aggrid", "altair", "plotly.express", "plotly.graph_objects",
+    "matplotlib.figure",
+]
+
+# =========================================================================
+# LAZY IMPORTS
+# =========================================================================
+# Heavy libraries that only one tab or export needs are imported on first use
+# through _lazy_import(), so the login page does not pay for them. PIL stays a
+# top-level import because the login CAPTCHA needs it.
+@st.cache_resource(show_spinner=False)
+def get_import_timings():
+    """{module: seconds} for every module _lazy_import() loaded in this process."""
+    return {}
+
+
+def _lazy_import(name):
+    """Import `name` on first use, recording how long the first load took."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    get_import_timings()[name] = time.perf_counter() - start
+    return module
+
+
+def cold_import_seconds(name):
+    """Import time of `name` in a fresh interpreter (python -X importtime), or None."""
+    try:
+        run = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {name}"],
+            capture_output=True, text=True, timeout=120,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if run.returncode != 0:
+        return None
+    # Lines look like "import time:  self [us] | cumulative | package"
+    for line in run.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == name:
+            return int(parts[1]) / 1e6
+    return None
+
 # =========================================================================
 # GLOBAL RESPONSIVE CSS (mobile-first + adaptive)
 # =========================================================================
@@ -335,8 +445,14 @@ DEFAULT_SESSION_STATE = {
     "captcha_fail_count": lambda: 0,    # wrong CAPTCHA attempts this session
     "logged_in": lambda: False,
     "user": lambda: None,
-    "df": lambda: None,
+    "snapshot": lambda: None,          # shared DataSnapshot this session is viewing
+    "df_overlay": lambda: {},          # {sheet_row: {column: value}} saved by this session
+    "overlay_df": lambda: None,        # session_df() result cached until the next edit
     "feedback_submitting": lambda: False,
+    "pending_writes": lambda: {},      # {submission id: local edits} queued by this session
+    "grid_dirty": lambda: {},          # {sheet_row: remark} typed in the editor, not yet submitted
+    "grid_nonce": lambda: 0,           # bumped on submit/refresh so the grid starts from fresh data
+    "grid_last_event": lambda: None,   # (sheet_row, oldValue, newValue) of the last edit event applied
 }
 for _key, _default_factory in DEFAULT_SESSION_STATE.items():
     if _key not in st.session_state:
@@ -541,25 +657,279 @@ if st.button("🗑️ Clear All Responses", key="clear_responses_btn", use_conta
 # =========================================================================
 # GOOGLE SHEETS CONNECTION
 # =========================================================================
+GOOGLE_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+class PooledSheetsHTTPClient(HTTPClient):
+    """gspread HTTP client shared by every loader in the process.
+
+    One AuthorizedSession (keep-alive connection pool, token refreshed by
+    google-auth when it expires), at most SHEETS_MAX_CONCURRENCY requests in
+    flight, and jittered exponential backoff on 429 / 5xx. gspread's own
+    BackOffHTTPClient keeps its retry counter on the class, which is not safe
+    once sessions share a client, and it does not retry 5xx.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    _slots = threading.BoundedSemaphore(SHEETS_MAX_CONCURRENCY)
+
+    def __init__(self, auth, session=None):
+        if session is None:
+            session = AuthorizedSession(auth)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=SHEETS_MAX_CONCURRENCY)
+            session.mount("https://", adapter)
+        super().__init__(auth, session)
+
+    def request(self, *args, **kwargs):
+        return self.with_retries(lambda: super(PooledSheetsHTTPClient, self).request(*args, **kwargs))
+
+    @classmethod
+    def with_retries(cls, call):
+        """Run one API call inside the shared concurrency limit and retry policy."""
+        delay = SHEETS_RETRY_BASE_SECONDS
+        for attempt in range(SHEETS_MAX_RETRIES + 1):
+            try:
+                with cls._slots:
+                    return call()
+            except gspread.exceptions.APIError as e:
+                status = getattr(e.response, "status_code", None)
+                if status not in cls.RETRY_STATUS or attempt == SHEETS_MAX_RETRIES:
+                    raise
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, SHEETS_RETRY_MAX_SECONDS)
+
+
+class SheetsClientPool:
+    """One authorized gspread client for the process plus a cache of
+    worksheet handles, so opening a sheet costs one metadata call per
+    (sheet_id, sheet_name) instead of a fresh auth handshake per loader."""
+
+    def __init__(self, service_account_info):
+        info = dict(service_account_info)
+        if "private_key" in info:
+            info["private_key"] = info["private_key"].replace("\\n", "\n")
+        creds = Credentials.from_service_account_info(info, scopes=GOOGLE_SCOPES)
+        self.client = gspread.authorize(creds, http_client=PooledSheetsHTTPClient)
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def worksheet(self, sheet_id, sheet_name):
+        key = (sheet_id, sheet_name)
+        with self._lock:
+            ws = self._worksheets.get(key)
+            if ws is None:
+                ws = self.client.open_by_key(sheet_id).worksheet(sheet_name)
+                self._worksheets[key] = ws
+            return ws
+
+
+class LocalSheetsBackend:
+    """Drop-in for SheetsClientPool that keeps spreadsheets in SQLite, so the
+    app can be developed offline and load-tested without spending quota.
+
+    worksheet() returns a LocalWorksheet emulating the gspread calls the app
+    makes (get_all_values, row_values, batch_get, and on .spreadsheet
+    get_lastUpdateTime and values_batch_update) with the same trimming of
+    trailing blank cells and rows as the API. Every call sleeps `latency` plus
+    up to `jitter` seconds and fails with a 429 APIError at `error_rate`,
+    inside PooledSheetsHTTPClient's concurrency limit and retry loop, so
+    throttling behaves as it does against Google. Cells are stored as text.
+    """
+
+    def __init__(self, db_path=":memory:", latency=0.0, jitter=0.0, error_rate=0.0,
+                 seed=None, seed_dir=None):
+        self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+        self.seed_dir = seed_dir
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS spreadsheets (id TEXT PRIMARY KEY, updated TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS worksheets ("
+            " spreadsheet TEXT NOT NULL, title TEXT NOT NULL, position INTEGER NOT NULL,"
+            " PRIMARY KEY (spreadsheet, title));"
+            "CREATE TABLE IF NOT EXISTS sheet_rows ("
+            " spreadsheet TEXT NOT NULL, title TEXT NOT NULL, row INTEGER NOT NULL, cells TEXT NOT NULL,"
+            " PRIMARY KEY (spreadsheet, title, row));"
+        )
+        self.metrics = {"calls": 0, "throttled": 0}
+
+    def call(self, func, *args):
+        """One emulated API request: latency, maybe a 429, then `func(*args)`."""
+        return PooledSheetsHTTPClient.with_retries(lambda: self._serve(func, *args))
+
+    def _serve(self, func, *args):
+        with self._lock:
+            self.metrics["calls"] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            throttled = self._random.random() < self.error_rate
+        time.sleep(delay)
+        if throttled:
+            with self._lock:
+                self.metrics["throttled"] += 1
+            response = requests.models.Response()
+            response.status_code = 429
+            response._content = json.dumps({"error": {
+                "code": 429, "status": "RESOURCE_EXHAUSTED",
+                "message": "Quota exceeded (injected by LocalSheetsBackend)",
+            }}).encode()
+            raise gspread.exceptions.APIError(response)
+        with self._lock:
+            return func(*args)
+
+    def worksheet(self, sheet_id, sheet_name):
+        with self._lock:
+            exists = self._db.execute(
+                "SELECT 1 FROM worksheets WHERE spreadsheet = ? AND title = ?", (sheet_id, sheet_name)
+            ).fetchone()
+            if not exists:
+                position = self._db.execute(
+                    "SELECT COUNT(*) FROM worksheets WHERE spreadsheet = ?", (sheet_id,)
+                ).fetchone()[0]
+                self._db.execute("INSERT INTO worksheets VALUES (?, ?, ?)", (sheet_id, sheet_name, position))
+                self._touch(sheet_id)
+                self._db.commit()
+        if not exists and self.seed_dir:
+            seed_path = os.path.join(self.seed_dir, f"{sheet_name}.csv")
+            if os.path.exists(seed_path):
+                with open(seed_path, newline="", encoding="utf-8") as f:
+                    self.import_rows(sheet_id, sheet_name, list(csv.reader(f)))
+        return LocalWorksheet(self, LocalSpreadsheet(self, sheet_id), sheet_name)
+
+    def import_rows(self, sheet_id, sheet_name, rows):
+        """Replace a worksheet's contents with `rows` (row 1 first), e.g. to
+        seed a load test from a get_all_values() dump."""
+        with self._lock:
+            self._db.execute("DELETE FROM sheet_rows WHERE spreadsheet = ? AND title = ?", (sheet_id, sheet_name))
+            self._db.executemany(
+                "INSERT INTO sheet_rows VALUES (?, ?, ?, ?)",
+                [(sheet_id, sheet_name, i + 1, json.dumps([str(v) for v in row])) for i, row in enumerate(rows)],
+            )
+            self._touch(sheet_id)
+            self._db.commit()
+
+    def _touch(self, sheet_id):
+        self._db.execute(
+            "INSERT OR REPLACE INTO spreadsheets VALUES (?, ?)",
+            (sheet_id, datetime.now(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")),
+        )
+
+    # ---- storage primitives, called with self._lock held ----
+    def _read(self, sheet_id, title, a1_range):
+        """Cells of one A1 range, trimmed the way the Values API trims them."""
+        grid = gspread.utils.a1_range_to_grid_range(a1_range)
+        r0, c0 = grid.get("startRowIndex", 0) + 1, grid.get("startColumnIndex", 0)
+        r1, c1 = grid.get("endRowIndex"), grid.get("endColumnIndex")
+        stored = dict(self._db.execute(
+            "SELECT row, cells FROM sheet_rows WHERE spreadsheet = ? AND title = ? AND row >= ? AND row <= ?",
+            (sheet_id, title, r0, r1 if r1 is not None else sys.maxsize),
+        ).fetchall())
+        last = max(stored, default=r0 - 1)
+        rows = []
+        for r in range(r0, last + 1):
+            cells = json.loads(stored[r])[c0:c1] if r in stored else []
+            while cells and cells[-1] == "":
+                cells.pop()
+            rows.append(cells)
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def _write(self, sheet_id, title, a1_range, values):
+        grid = gspread.utils.a1_range_to_grid_range(a1_range)
+        r0, c0 = grid.get("startRowIndex", 0) + 1, grid.get("startColumnIndex", 0)
+        for k, new in enumerate(values):
+            found = self._db.execute(
+                "SELECT cells FROM sheet_rows WHERE spreadsheet = ? AND title = ? AND row = ?",
+                (sheet_id, title, r0 + k),
+            ).fetchone()
+            cells = json.loads(found[0]) if found else []
+            cells += [""] * (c0 + len(new) - len(cells))
+            cells[c0:c0 + len(new)] = ["" if v is None else str(v) for v in new]
+            self._db.execute(
+                "INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?, ?)",
+                (sheet_id, title, r0 + k, json.dumps(cells)),
+            )
+        return sum(len(new) for new in values)
+
+
+class LocalSpreadsheet:
+    def __init__(self, backend, sheet_id):
+        self._backend = backend
+        self.id = sheet_id
+
+    def get_lastUpdateTime(self):
+        def _updated():
+            return self._backend._db.execute(
+                "SELECT updated FROM spreadsheets WHERE id = ?", (self.id,)
+            ).fetchone()[0]
+        return self._backend.call(_updated)
+
+    def values_batch_update(self, body):
+        """Apply {"data": [{"range", "values"}, ...]}. As with the API, a range
+        without a "Title!" prefix addresses the first worksheet."""
+        def _update():
+            db = self._backend._db
+            first = db.execute(
+                "SELECT title FROM worksheets WHERE spreadsheet = ? ORDER BY position LIMIT 1", (self.id,)
+            ).fetchone()[0]
+            updated = 0
+            for item in body.get("data", []):
+                title, _, a1_range = item["range"].rpartition("!")
+                title = title.strip("'").replace("''", "'") or first
+                updated += self._backend._write(self.id, title, a1_range, item["values"])
+            self._backend._touch(self.id)
+            db.commit()
+            return {"spreadsheetId": self.id, "totalUpdatedCells": updated}
+        return self._backend.call(_update)
+
+
+class LocalWorksheet:
+    def __init__(self, backend, spreadsheet, title):
+        self._backend = backend
+        self.spreadsheet = spreadsheet
+        self.title = title
+
+    def get_all_values(self):
+        rows = self._backend.call(self._backend._read, self.spreadsheet.id, self.title, "A1:ZZZ")
+        width = max((len(r) for r in rows), default=0)
+        return [r + [""] * (width - len(r)) for r in rows]
+
+    def row_values(self, row):
+        rows = self._backend.call(self._backend._read, self.spreadsheet.id, self.title, f"{row}:{row}")
+        return rows[0] if rows else []
+
+    def batch_get(self, ranges):
+        def _batch():
+            return [self._backend._read(self.spreadsheet.id, self.title, r) for r in ranges]
+        return self._backend.call(_batch)
+
+
 @st.cache_resource
+def get_sheets_client():
+    if SHEETS_BACKEND == "local":
+        return LocalSheetsBackend(
+            LOCAL_SHEETS_DB_PATH, latency=LOCAL_SHEETS_LATENCY_SECONDS, jitter=LOCAL_SHEETS_JITTER_SECONDS,
+            error_rate=LOCAL_SHEETS_429_RATE, seed=LOCAL_SHEETS_RANDOM_SEED, seed_dir=LOCAL_SHEETS_SEED_DIR,
+        )
+    return SheetsClientPool(st.secrets["gcp_service_account"])
+
+
 def connect_to_gsheet():
-    SCOPES = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    service_account_info = dict(st.secrets["gcp_service_account"])
-    if "private_key" in service_account_info:
-        service_account_info["private_key"] = service_account_info["private_key"].replace("\\n", "\n")
-    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
-    gc = gspread.authorize(creds)
     SHEET_ID = st.secrets["google_sheets"]["sheet_id"]
     SHEET_NAME = st.secrets["google_sheets"]["sheet_name"]
-    return gc.open_by_key(SHEET_ID).worksheet(SHEET_NAME)
+    return get_sheets_client().worksheet(SHEET_ID, SHEET_NAME)
 
 
 try:
     sheet = connect_to_gsheet()
-    st.sidebar.success("✅ Connected to Google Sheets!")
+    if SHEETS_BACKEND == "local":
+        st.sidebar.success("✅ Connected to the local Sheets stand-in!")
+    else:
+        st.sidebar.success("✅ Connected to Google Sheets!")
 except Exception as e:
     st.error(f"❌ Could not connect to Google Sheets: {e}")
     st.stop()
@@ -568,18 +938,8 @@ except Exception as e:
 # =========================================================================
 # INSPECTIONS SHEET CONNECTION (separate sheet, used for WhatsApp reports)
 # =========================================================================
-@st.cache_resource
 def connect_to_inspections_sheet():
-    SCOPES = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    service_account_info = dict(st.secrets["gcp_service_account"])
-    if "private_key" in service_account_info:
-        service_account_info["private_key"] = service_account_info["private_key"].replace("\\n", "\n")
-    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
-    gc = gspread.authorize(creds)
-    return gc.open_by_key(INSPECTIONS_SHEET_ID).worksheet(INSPECTIONS_SHEET_NAME)
+    return get_sheets_client().worksheet(INSPECTIONS_SHEET_ID, INSPECTIONS_SHEET_NAME)
 
 
 @st.cache_data(ttl=30)
@@ -589,26 +949,19 @@ def load_inspections_data():
     cols = list(INSPECTIONS_COL_MAP.keys())
     try:
         ws = connect_to_inspections_sheet()
-        values = ws.get_all_values()
-        if not values or len(values) < 2:
+        # Data rows (row 1 is the header) of the mapped columns only
+        matrix = fetch_columns(ws, list(INSPECTIONS_COL_MAP.values()))
+        if len(matrix) == 0:
             return pd.DataFrame(columns=cols + ["Date_parsed"])
 
-        max_idx = max(INSPECTIONS_COL_MAP.values())
-        records = []
-        for row in values[1:]:  # skip header row
-            if len(row) <= max_idx:
-                row = row + [""] * (max_idx + 1 - len(row))
-            records.append({name: row[idx].strip() for name, idx in INSPECTIONS_COL_MAP.items()})
-
-        df = pd.DataFrame(records)
+        df = pd.DataFrame(matrix, columns=cols)
+        for c in cols:
+            df[c] = df[c].astype(str).str.strip()
         # Drop fully blank rows
-        df = df[df[cols].apply(lambda r: any(str(v).strip() for v in r), axis=1)].reset_index(drop=True)
+        df = df[(df[cols].apply(lambda s: s.str.len()) > 0).to_numpy().any(axis=1)].reset_index(drop=True)
 
-        # Parse dates - try the default parser first, then fall back to day-first
-        df["Date_parsed"] = pd.to_datetime(df["Date"], errors="coerce")
-        mask = df["Date_parsed"].isna() & (df["Date"].astype(str).str.strip() != "")
-        if mask.any():
-            df.loc[mask, "Date_parsed"] = pd.to_datetime(df.loc[mask, "Date"], errors="coerce", dayfirst=True)
+        # Month-first for ambiguous cells, day-first layouts are still recognised
+        df["Date_parsed"] = parse_sheet_dates(df["Date"])
 
         return df
     except Exception as e:
@@ -864,6 +1217,16 @@ FOOTPLATE_ROUTES = list(FOOTPLATE_ROUTE_HIERARCHY.keys())
 ALL_FOOTPLATE_LOCATIONS = FOOTPLATE_ROUTES + [sub for subs in FOOTPLATE_ROUTE_HIERARCHY.values() for sub in subs]
 ALL_LOCATIONS = STATION_LIST + GATE_LIST + ALL_FOOTPLATE_LOCATIONS
 
+# Location kinds, in precedence order (several footplate sub-locations are also stations)
+LOCATION_KINDS = ["station", "lc_gate", "footplate_route", "footplate_sub", "other"]
+STATION_CODES = frozenset(STATION_LIST)
+GATE_CODES = frozenset(GATE_LIST)
+# Route -> the route itself plus every sub-location it covers; other codes expand to themselves
+FOOTPLATE_CLOSURE = {
+    route: frozenset([route, *subs]) for route, subs in FOOTPLATE_ROUTE_HIERARCHY.items()
+}
+FOOTPLATE_SUB_CODES = frozenset(sub for subs in FOOTPLATE_ROUTE_HIERARCHY.values() for sub in subs)
+
 HEAD_LIST = ["", "ELECT/TRD", "ELECT/G", "ELECT/TRO", "SIGNAL & TELECOM", "OPTG", "MECHANICAL",
              "ENGINEERING", "COMMERCIAL", 'PERSONNEL', 'SECURITY', "FINANCE", "MEDICAL", "STORE", 'GSU']
 
@@ -905,6 +1268,42 @@ def normalize_str(text):
     return re.sub(r'\s+', ' ', text.lower()).strip()
 
 
+RESOLVED_KEYWORDS = [
+    "attended", "solved", "done", "completed", "confirmed by", "message given",
+    "tdc work completed", "replaced", "msg given", "msg sent", "counseled", "info shared",
+    "communicated", "sent successfully", "counselled", "gate will be closed soon",
+    "attending at the time", "handled", "resolved", "action taken", "spoken to", "warned",
+    "counselling", "hubli", "working normal", "met", "discussion held", "report sent",
+    "notified", "explained", "nil", "na", "tlc", "work completed", "acknowledged", "visited",
+    "briefed", "guided", "handover", "working properly", "checked found working", "supply restored",
+    "this is not a deficiency.", "this is not a deficiency", "not a deficiency", "this is observation",
+    "it is observation", "updated by", "adv to", "counselled the staff", "complied", "checked and found",
+    "maintained", "for needful action", "provided at", "in working condition", "is working",
+    "found working", "equipment is working", "item is working", "as per plan", "putright", "put right",
+    'attend dt', 'attend dt.', "operational feasibility", "will be provided",
+    "will be supplied shortly", "advised to ubl", "updated"
+]
+PENDING_KEYWORDS = [
+    "work is going on", "tdc given", "target date", "expected by", "likely by", "planned by",
+    "will be", "needful", "to be", "pending", "not done", "awaiting", "waiting", "yet to", "next time",
+    "follow up", "tdc.", "tdc", "t d c", "will attend", "will be attended", "scheduled", "reminder",
+    "to inform", "to counsel", "to submit", "to do", "to replace", "prior", "remains", "still",
+    "under process", "not yet", "to be done", "will ensure", "during next", "action will be taken",
+    'noted please tdc', "will be supplied shortly", "not available", "not updated", "progress",
+    "under progress", "to arrange", "awaited", "material awaited", "approval awaited", "to procure",
+    "yet pending", "incomplete", "tentative", "ongoing", "in progress", "being done", "arranging",
+    "waiting for", "subject to", "awaiting approval", "awaiting material", "awaiting confirmation",
+    "next schedule", "planned for", "will arrange", "proposed date", "to complete", "to be completed",
+    "likely completion", "expected completion", "not received", "awaiting response"
+]
+DATE_IN_TEXT_PATTERN = r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b'
+
+# One alternation per keyword list, so the batch classifier scans each cell
+# once per list instead of once per keyword.
+_RESOLVED_PATTERN = "|".join(re.escape(k) for k in RESOLVED_KEYWORDS)
+_PENDING_PATTERN = "|".join(re.escape(k) for k in PENDING_KEYWORDS)
+
+
 def classify_feedback(feedback, user_remark=""):
     if isinstance(feedback, str) and feedback.strip() == "`":
         return ""
@@ -912,42 +1311,14 @@ def classify_feedback(feedback, user_remark=""):
     def _classify(text_normalized):
         if not text_normalized:
             return None
-        date_found = bool(re.search(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', text_normalized))
-        resolved_kw = [
-            "attended", "solved", "done", "completed", "confirmed by", "message given",
-            "tdc work completed", "replaced", "msg given", "msg sent", "counseled", "info shared",
-            "communicated", "sent successfully", "counselled", "gate will be closed soon",
-            "attending at the time", "handled", "resolved", "action taken", "spoken to", "warned",
-            "counselling", "hubli", "working normal", "met", "discussion held", "report sent",
-            "notified", "explained", "nil", "na", "tlc", "work completed", "acknowledged", "visited",
-            "briefed", "guided", "handover", "working properly", "checked found working", "supply restored",
-            "this is not a deficiency.", "this is not a deficiency", "not a deficiency", "this is observation",
-            "it is observation", "updated by", "adv to", "counselled the staff", "complied", "checked and found",
-            "maintained", "for needful action", "provided at", "in working condition", "is working",
-            "found working", "equipment is working", "item is working", "as per plan", "putright", "put right",
-            'attend dt', 'attend dt.', "operational feasibility", "will be provided",
-            "will be supplied shortly", "advised to ubl", "updated"
-        ]
-        pending_kw = [
-            "work is going on", "tdc given", "target date", "expected by", "likely by", "planned by",
-            "will be", "needful", "to be", "pending", "not done", "awaiting", "waiting", "yet to", "next time",
-            "follow up", "tdc.", "tdc", "t d c", "will attend", "will be attended", "scheduled", "reminder",
-            "to inform", "to counsel", "to submit", "to do", "to replace", "prior", "remains", "still",
-            "under process", "not yet", "to be done", "will ensure", "during next", "action will be taken",
-            'noted please tdc', "will be supplied shortly", "not available", "not updated", "progress",
-            "under progress", "to arrange", "awaited", "material awaited", "approval awaited", "to procure",
-            "yet pending", "incomplete", "tentative", "ongoing", "in progress", "being done", "arranging",
-            "waiting for", "subject to", "awaiting approval", "awaiting material", "awaiting confirmation",
-            "next schedule", "planned for", "will arrange", "proposed date", "to complete", "to be completed",
-            "likely completion", "expected completion", "not received", "awaiting response"
-        ]
-        if "tdc" in text_normalized and any(k in text_normalized for k in resolved_kw):
+        date_found = bool(re.search(DATE_IN_TEXT_PATTERN, text_normalized))
+        if "tdc" in text_normalized and any(k in text_normalized for k in RESOLVED_KEYWORDS):
             return "Resolved"
-        if any(k in text_normalized for k in pending_kw):
+        if any(k in text_normalized for k in PENDING_KEYWORDS):
             return "Pending"
         if date_found:
             return "Pending" if "tdc" in text_normalized else "Resolved"
-        if any(k in text_normalized for k in resolved_kw):
+        if any(k in text_normalized for k in RESOLVED_KEYWORDS):
             return "Resolved"
         return None
 
@@ -965,8 +1336,252 @@ def classify_feedback(feedback, user_remark=""):
     return "Pending"
 
 
-def get_status(feedback, remark):
-    return classify_feedback(feedback, remark)
+def _per_unique(values, func):
+    """Apply a vectorized Series -> Series/array function to the distinct values
+    only and broadcast the result back. Sheet columns repeat the same handful of
+    replies ("Done", "Attended", blanks) thousands of times."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    result = np.asarray(func(pd.Series(uniques, dtype=object)))
+    return result[codes]
+
+
+def normalize_str_series(values):
+    """Vectorized normalize_str(): non-strings become "", text is lower-cased
+    with whitespace runs collapsed and the ends stripped."""
+    def _normalize(uniques):
+        text = uniques.where(uniques.map(lambda v: isinstance(v, str)).astype(bool), "")
+        return text.str.lower().str.replace(r"\s+", " ", regex=True).str.strip()
+
+    values = pd.Series(values, dtype=object)
+    return pd.Series(_per_unique(values, _normalize), index=values.index, dtype=object)
+
+
+# Explicit formats, tried in order; one of them is chosen per column (see
+# parse_sheet_dates). Only the day/month order of the ambiguous numeric
+# layouts depends on dayfirst.
+_ISO_DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d"]
+_DMY_DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%Y %H:%M:%S", "%d/%m/%y"]
+_MDY_DATE_FORMATS = ["%m/%d/%Y", "%m-%d-%Y", "%m/%d/%Y %H:%M:%S", "%m/%d/%y"]
+_NAMED_MONTH_FORMATS = ["%d-%b-%Y", "%d %b %Y", "%d-%b-%y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y"]
+SHEET_DATE_MEMO_MAX = 50_000
+# format (or ("mixed", dayfirst) for the fallback parser) -> {cell text: value}
+_SHEET_DATE_MEMO = {}
+_SHEET_DATE_LOCK = threading.Lock()
+
+
+def sheet_date_formats(dayfirst):
+    numeric = _DMY_DATE_FORMATS + _MDY_DATE_FORMATS if dayfirst else _MDY_DATE_FORMATS + _DMY_DATE_FORMATS
+    return _ISO_DATE_FORMATS + numeric + _NAMED_MONTH_FORMATS
+
+
+def _memo_dates(key, texts, parse):
+    """Parsed values for distinct strings `texts` through the memo under
+    `key`; parse(missing) is called only for strings not yet memoized. The
+    memo is only touched under _SHEET_DATE_LOCK, and lookups are answered
+    from a local copy, so a concurrent clear() never yields NaT."""
+    with _SHEET_DATE_LOCK:
+        memo = _SHEET_DATE_MEMO.get(key, {})
+        known = {t: memo[t] for t in texts if t in memo}
+    missing = texts[texts.map(lambda t: t not in known)]
+    if not missing.empty:
+        fresh = pd.to_datetime(parse(missing)).astype("datetime64[ns]")
+        with _SHEET_DATE_LOCK:
+            memo = _SHEET_DATE_MEMO.setdefault(key, {})
+            if len(memo) + len(missing) > SHEET_DATE_MEMO_MAX:
+                memo.clear()
+            memo.update(zip(missing, fresh))
+        known.update(zip(missing, fresh))
+    return pd.to_datetime(texts.map(known)).astype("datetime64[ns]")
+
+
+def _column_date_format(texts, dayfirst):
+    """(format, parsed) for a column's non-blank distinct strings, chosen from
+    those strings alone: the first format that parses all of them, else the
+    one that parses the most. `dayfirst` only orders the candidates, so it
+    decides between D/M and M/D when every cell fits both."""
+    best, best_parsed = None, None
+    for fmt in sheet_date_formats(dayfirst):
+        parsed = _memo_dates(fmt, texts, lambda t, fmt=fmt: pd.to_datetime(t, format=fmt, errors="coerce"))
+        if best_parsed is None or parsed.notna().sum() > best_parsed.notna().sum():
+            best, best_parsed = fmt, parsed
+        if parsed.notna().all():
+            break
+    return best, best_parsed
+
+
+def parse_sheet_dates(values, dayfirst=False):
+    """Parse a column of sheet date cells into datetime64 with one format for
+    the whole column, so a day-first sheet never has 05/04/2024 read as May
+    next to 25/04/2024. `dayfirst` only breaks ties when every cell is
+    ambiguous. Cells the chosen format cannot read go through the general
+    parser, with the day/month order the chosen format implies.
+
+    Work is per distinct string, and parses are memoized across reloads.
+    Columns that are already datetime64 are returned unchanged, so callers
+    downstream of load_data() never parse twice."""
+    values = pd.Series(values)
+    if is_datetime64_any_dtype(values):
+        return values
+
+    def _parse(uniques):
+        texts = uniques.map(lambda v: "" if v is None or v is pd.NaT or v != v else str(v).strip())
+        parsed = pd.Series(pd.NaT, index=texts.index, dtype="datetime64[ns]")
+        cells = texts[texts != ""]
+        if cells.empty:
+            return parsed
+        fmt, fresh = _column_date_format(cells, dayfirst)
+        rest = fresh.isna()
+        if rest.any():
+            mixed_dayfirst = fmt in _DMY_DATE_FORMATS or (dayfirst and fmt not in _MDY_DATE_FORMATS)
+            fresh[rest] = _memo_dates(
+                ("mixed", mixed_dayfirst), cells[rest],
+                lambda t: pd.to_datetime(t, format="mixed", errors="coerce", dayfirst=mixed_dayfirst),
+            )
+        parsed[cells.index] = fresh
+        return parsed
+
+    return pd.Series(_per_unique(values, _parse), index=values.index, dtype="datetime64[ns]")
+
+
+def _resolved_mask(text_normalized):
+    """True where the scalar _classify() inside classify_feedback() would say
+    'Resolved'. "tdc" is itself a pending keyword, so a cell mentioning it is
+    only resolved by an explicit resolved keyword."""
+    def _mask(uniques):
+        has_tdc = uniques.str.contains("tdc", regex=False)
+        has_resolved = uniques.str.contains(_RESOLVED_PATTERN, regex=True)
+        has_pending = uniques.str.contains(_PENDING_PATTERN, regex=True)
+        has_date = uniques.str.contains(DATE_IN_TEXT_PATTERN, regex=True)
+        return (has_tdc & has_resolved) | (~has_tdc & ~has_pending & (has_date | has_resolved))
+
+    return _per_unique(text_normalized, _mask).astype(bool)
+
+
+def _last_marker(text_normalized):
+    """Last '#' / '!' in each cell, or "" when there is none."""
+    return _per_unique(
+        text_normalized,
+        lambda u: u.str.extract(r"([!#])[^!#]*$", expand=False).fillna(""),
+    )
+
+
+def _classify_normalized_batch(fb, rm):
+    """classify_feedback() over already-normalized feedback/remark Series."""
+    status = np.where(_resolved_mask(fb) | _resolved_mask(rm), "Resolved", "Pending").astype(object)
+
+    # A '#' / '!' marker anywhere in "feedback remark" overrides the keywords;
+    # the last one wins, so the remark's marker beats the feedback's.
+    fb_marker = _last_marker(fb)
+    rm_marker = _last_marker(rm)
+    marker = np.where(rm_marker != "", rm_marker, fb_marker)
+    status[marker == "#"] = "Resolved"
+    status[marker == "!"] = "Pending"
+
+    status[(fb == "`").to_numpy()] = ""
+    return pd.Series(status, index=fb.index, dtype=object)
+
+
+def classify_feedback_batch(feedback, remark):
+    """Vectorized classify_feedback() over whole columns.
+
+    Returns a Series aligned with `feedback` holding exactly what
+    classify_feedback(feedback[i], remark[i]) returns for every row.
+    """
+    if remark is None:
+        remark = pd.Series("", index=feedback.index, dtype=object)
+    if len(feedback) == 0:
+        return pd.Series([], index=feedback.index, dtype=object)
+    fb = normalize_str_series(feedback)
+    rm = normalize_str_series(remark).set_axis(feedback.index)
+    return _classify_normalized_batch(fb, rm)
+
+
+class ClassificationCache:
+    """LRU memo of classify_feedback() results keyed by a hash of the
+    normalized (Feedback, Remark) pair. Most sheet rows never change between
+    reloads, so after the first pass a reload only classifies new or edited
+    replies. With `db_path` the memo is also written to SQLite, capped at
+    `max_entries` rows, and read back on start-up.
+
+    Keys are hashed with a fingerprint of the keyword lists and date pattern,
+    so entries saved under older classification rules are never returned.
+    """
+
+    def __init__(self, max_entries, db_path=None):
+        self.max_entries = max_entries
+        self._rules = hashlib.blake2b(
+            json.dumps([RESOLVED_KEYWORDS, PENDING_KEYWORDS, DATE_IN_TEXT_PATTERN]).encode("utf-8"),
+            digest_size=16,
+        ).digest()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS status_memo (key TEXT PRIMARY KEY, status TEXT NOT NULL)"
+                )
+                rows = self._db.execute(
+                    "SELECT key, status FROM status_memo ORDER BY rowid DESC LIMIT ?", (max_entries,)
+                ).fetchall()
+                self._entries.update(reversed(rows))
+            except sqlite3.Error:
+                self._db = None  # fall back to an in-memory memo only
+
+    def _key(self, pair):
+        return hashlib.blake2b(pair.encode("utf-8"), digest_size=16, key=self._rules).hexdigest()
+
+    def classify(self, feedback, remark):
+        """Same result as classify_feedback_batch(feedback, remark)."""
+        if remark is None:
+            remark = pd.Series("", index=feedback.index, dtype=object)
+        if len(feedback) == 0:
+            return pd.Series([], index=feedback.index, dtype=object)
+        fb = normalize_str_series(feedback)
+        rm = normalize_str_series(remark).set_axis(feedback.index)
+        # Normalized text has no "\x1f" (it counts as whitespace), so it is a safe separator
+        codes, pairs = pd.factorize(fb + "\x1f" + rm)
+        keys = [self._key(p) for p in pairs]
+
+        results = np.empty(len(pairs), dtype=object)
+        misses = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                status = self._entries.get(key)
+                if status is None:
+                    misses.append(i)
+                else:
+                    results[i] = status
+                    self._entries.move_to_end(key)
+
+        if misses:
+            split = pd.Series(pairs[misses], dtype=object).str.split("\x1f", n=1, expand=True)
+            computed = _classify_normalized_batch(split[0], split[1]).to_numpy()
+            results[misses] = computed
+            fresh = [(keys[i], status) for i, status in zip(misses, computed)]
+            with self._lock:
+                self._entries.update(fresh)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                if self._db is not None:
+                    try:
+                        self._db.executemany("INSERT OR REPLACE INTO status_memo VALUES (?, ?)", fresh)
+                        # rowids only grow, so this keeps at most the newest max_entries rows
+                        self._db.execute(
+                            "DELETE FROM status_memo WHERE rowid <= (SELECT MAX(rowid) FROM status_memo) - ?",
+                            (self.max_entries,),
+                        )
+                        self._db.commit()
+                    except sqlite3.Error:
+                        pass
+
+        return pd.Series(results[codes], index=feedback.index, dtype=object)
+
+
+@st.cache_resource
+def get_classification_cache():
+    return ClassificationCache(CLASSIFICATION_CACHE_SIZE, CLASSIFICATION_CACHE_PATH)
 
 
 def color_text_status(status):
@@ -978,91 +1593,968 @@ def strip_status_emoji(status_text):
     return re.sub(r"^[^\w]*", "", str(status_text)).strip()
 
 
+def canonical_location(text):
+    """The one spelling of a location code used everywhere: trimmed, upper
+    case, single spaces, stray quote/asterisk/underscore characters dropped.
+    Hyphens stay, so codes match the LC gate and footplate route lists."""
+    if pd.isna(text):
+        return ""
+    s = re.sub(r"[\*\_\'\"]", "", str(text))
+    return re.sub(r"\s+", " ", s).strip().upper()
+
+
+def canonicalize_locations(values):
+    """canonical_location() over a column, computed once per distinct value."""
+    return pd.Series(
+        _per_unique(values.astype(object), lambda u: u.map(canonical_location)),
+        index=values.index, dtype=object,
+    )
+
+
+def location_kind(code):
+    if code in STATION_CODES:
+        return "station"
+    if code in GATE_CODES or code.startswith("LC-"):
+        return "lc_gate"
+    if code in FOOTPLATE_CLOSURE:
+        return "footplate_route"
+    if code in FOOTPLATE_SUB_CODES:
+        return "footplate_sub"
+    return "other"
+
+
+def location_kinds(locations):
+    """Categorical Location_kind column for a categorical Location column,
+    classifying each category once."""
+    cats = locations.cat.categories
+    kind_codes = np.array([LOCATION_KINDS.index(location_kind(str(c))) for c in cats], dtype=np.int8)
+    codes = locations.cat.codes.to_numpy()
+    kinds = np.where(codes >= 0, kind_codes[codes] if len(cats) else 0, LOCATION_KINDS.index("other"))
+    return pd.Series(pd.Categorical.from_codes(kinds, LOCATION_KINDS), index=locations.index)
+
+
+@functools.lru_cache(maxsize=256)
+def _expand_location_set(selected):
+    expanded = set()
+    for loc in selected:
+        expanded |= FOOTPLATE_CLOSURE.get(loc, {loc})
+    return frozenset(expanded)
+
+
 def expand_locations(selected_locations):
     """Expand any selected footplate routes into their constituent sub-locations."""
-    expanded = set(selected_locations)
-    for loc in selected_locations:
-        if loc in FOOTPLATE_ROUTE_HIERARCHY:
-            expanded.update(FOOTPLATE_ROUTE_HIERARCHY[loc])
-    return expanded
+    return set(_expand_location_set(frozenset(selected_locations)))
+
+
+# =========================================================================
+# HELPERS — typed schema for the deficiency table
+# =========================================================================
+# Low-cardinality columns are stored as pandas Categoricals. Category order is
+# fixed by the constant lists above, so the codes of known values are the same
+# on every reload. Values outside a list (typos, retired codes, officer cells
+# holding several comma-separated names) are appended after the known ones
+# instead of being collapsed, because these columns are written back to the
+# sheet on submit. Missing cells go to the blank "" category.
+BLANK_CATEGORY = ""
+CATEGORICAL_SCHEMA = {
+    "Type of Inspection": VALID_INSPECTIONS,
+    "Location": ALL_LOCATIONS,
+    "Head": HEAD_LIST,
+    "Sub Head": [s for subs in SUBHEAD_LIST.values() for s in subs],
+    "Inspection By": INSPECTION_BY_LIST,
+    "Action By": ACTION_BY_LIST,
+}
+
+
+def to_schema_categorical(values, known):
+    """Categorical over `known` (de-duplicated, order kept) plus any other
+    values present, sorted, with missing values mapped to BLANK_CATEGORY."""
+    values = pd.Series(values, dtype=object).fillna(BLANK_CATEGORY).astype(str)
+    categories = list(dict.fromkeys([BLANK_CATEGORY] + list(known)))
+    known_set = set(categories)
+    extra = sorted(v for v in values.unique() if v not in known_set)
+    return values.astype(pd.CategoricalDtype(categories + extra))
+
+
+def apply_categorical_schema(df):
+    for col, known in CATEGORICAL_SCHEMA.items():
+        if col in df.columns:
+            df[col] = to_schema_categorical(df[col], known)
+    return df
+
+
+def set_at_positions(series, positions, values):
+    """Copy of `series` with `values` written at integer `positions`; adds any
+    new categories first when the column is categorical."""
+    series = series.copy()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        new = [v for v in pd.unique(pd.Series(values, dtype=object)) if v not in series.cat.categories]
+        if new:
+            series = series.cat.add_categories(new)
+    series.iloc[positions] = values
+    return series
+
+
+# =========================================================================
+# HELPERS — incremental sheet sync
+# =========================================================================
+def col_letter(col_idx):
+    """1-based column index -> A1 column letters (1 -> 'A', 28 -> 'AB')."""
+    return re.sub(r"\d+", "", gspread.utils.rowcol_to_a1(1, col_idx))
+
+
+def column_runs(indices):
+    """Sorted 0-based column indices -> [(first, last), ...] contiguous runs,
+    so a handful of scattered columns is fetched as a few A1 ranges."""
+    runs = []
+    for idx in sorted(set(indices)):
+        if runs and idx == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], idx)
+        else:
+            runs.append((idx, idx))
+    return runs
+
+
+def value_matrix(rows, width, height):
+    """Ragged API rows -> (height, width) object array padded with "". Cells
+    are placed with one boolean-mask assignment rather than per-row padding."""
+    out = np.full((height, width), "", dtype=object)
+    rows = rows[:height]
+    lengths = np.fromiter((min(len(r), width) for r in rows), dtype=np.int64, count=len(rows))
+    if lengths.sum():
+        cells = [v for r in rows for v in r[:width]]
+        out[:len(rows)][np.arange(width) < lengths[:, None]] = cells
+    return out
+
+
+def column_run_ranges(runs, first_row, last_row=""):
+    """A1 ranges for column_runs() output, from `first_row` down to `last_row`
+    (open-ended by default)."""
+    return [f"{col_letter(lo + 1)}{first_row}:{col_letter(hi + 1)}{last_row}" for lo, hi in runs]
+
+
+def stack_column_runs(blocks, runs, columns):
+    """batch_get() results for `runs` -> one padded matrix holding the 0-based
+    sheet `columns` in the order given."""
+    height = max((len(b) for b in blocks), default=0)
+    if not runs:
+        return np.empty((height, 0), dtype=object)
+    matrix = np.hstack([value_matrix(b, hi - lo + 1, height) for b, (lo, hi) in zip(blocks, runs)])
+    fetched = [i for lo, hi in runs for i in range(lo, hi + 1)]
+    return matrix[:, [fetched.index(c) for c in columns]]
+
+
+def fetch_columns(ws, columns, first_row=2):
+    """Rows `first_row`.. of just the 0-based sheet `columns`, in one batch_get."""
+    runs = column_runs(columns)
+    if not runs:
+        return np.empty((0, 0), dtype=object)
+    return stack_column_runs(ws.batch_get(column_run_ranges(runs, first_row)), runs, columns)
+
+
+def resolve_columns(header, keep):
+    """{name: 0-based column} for the header cells `keep(name)` accepts; the
+    first occurrence of a repeated name wins."""
+    positions = {}
+    for i, name in enumerate(header):
+        if name not in positions and keep(name):
+            positions[name] = i
+    return positions
+
+
+class ColumnProjection:
+    """The columns of one worksheet whose header `keep` accepts, e.g. the ones
+    the app actually reads, leaving photo links and other wide free-text
+    columns on the server.
+
+    The header is resolved once (one row_values(1) call). Every fetch() then
+    reads the header cells and data of only those columns in a single
+    batch_get, and resolves again only if the header cells no longer match
+    because columns were moved, renamed or inserted.
+    """
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.positions = None
+        self._lock = threading.Lock()
+
+    def fetch(self, ws):
+        """(names, {name: 0-based sheet column}, data rows matrix)."""
+        with self._lock:
+            for _ in range(2):
+                if self.positions is None:
+                    self.positions = resolve_columns([str(c).strip() for c in ws.row_values(1)], self.keep)
+                names, columns = list(self.positions), list(self.positions.values())
+                matrix = fetch_columns(ws, columns, first_row=1)
+                header = [str(v).strip() for v in matrix[0]] if len(matrix) else []
+                if header == names:
+                    break
+                self.positions = None
+            return names, dict(zip(names, columns)), matrix[1:]
+
+
+@st.cache_resource
+def get_column_projection(name, _keep):
+    """Process-wide ColumnProjection per sheet, so the header is resolved once."""
+    return ColumnProjection(_keep)
+
+
+def _payload_bytes(values):
+    return len(json.dumps(values, ensure_ascii=False))
+
+
+class DeficiencySheetSync:
+    """Local row snapshot of the main deficiency sheet, kept current with
+    delta reads instead of a get_all_values() on every reload.
+
+    Only the REQUIRED_COLS columns are held (see ColumnProjection); `header`
+    lists them in snapshot order and `positions` maps each to its sheet column.
+
+    Each sync() first asks Drive for the spreadsheet's last-modified time and
+    stops there if it has not moved. Otherwise a single batch_get fetches the
+    rows appended after the last known `_sheet_row` plus the SYNC_MUTABLE_COLS
+    columns of the known rows, which is all the app edits. A full read is done
+    on the first sync, every SYNC_FULL_RESYNC_SECONDS, and whenever the
+    SYNC_IDENTITY_COLS columns show that rows were inserted or deleted.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.positions = None
+        self.rows = []
+        self._projection = ColumnProjection(lambda name: name in REQUIRED_COLS)
+        self.version = 0
+        self._revision = None
+        self._last_full = 0.0
+        self._lock = threading.Lock()
+        self.metrics = {
+            "mode": None, "syncs": 0, "api_calls": 0, "rows_fetched": 0,
+            "bytes_fetched": 0, "last_rows_fetched": 0, "last_bytes_fetched": 0,
+            "rows_changed": 0, "synced_at": None,
+        }
+
+    def _record(self, mode, rows_fetched, bytes_fetched, api_calls):
+        m = self.metrics
+        m["mode"] = mode
+        m["syncs"] += 1
+        m["api_calls"] += api_calls
+        m["rows_fetched"] += rows_fetched
+        m["bytes_fetched"] += bytes_fetched
+        m["last_rows_fetched"] = rows_fetched
+        m["last_bytes_fetched"] = bytes_fetched
+        m["synced_at"] = datetime.now(pytz.timezone("Asia/Kolkata")).strftime("%d-%m-%Y %H:%M:%S")
+
+    def _full_sync(self, ws, revision, api_calls):
+        self.header, self.positions, matrix = self._projection.fetch(ws)
+        self.rows = matrix.tolist()
+        self._revision = revision
+        self._last_full = time.monotonic()
+        self.version += 1
+        self.metrics["rows_changed"] = len(self.rows)
+        self._record("full", len(self.rows) + 1, _payload_bytes(self.rows), api_calls + 1)
+        return True
+
+    def sync(self, ws):
+        """Bring the snapshot up to date. Returns True if any row changed."""
+        with self._lock:
+            api_calls = 1
+            try:
+                revision = ws.spreadsheet.get_lastUpdateTime()
+            except Exception:
+                revision = None  # no Drive access: fall back to always diffing
+
+            if self.header is None or time.monotonic() - self._last_full > SYNC_FULL_RESYNC_SECONDS:
+                return self._full_sync(ws, revision, api_calls)
+            if revision is not None and revision == self._revision:
+                self._record("unchanged", 0, 0, api_calls)
+                return False
+
+            identity_cols = [c for c in SYNC_IDENTITY_COLS if c in self.header]
+            tracked = identity_cols + [c for c in SYNC_MUTABLE_COLS if c in self.header]
+            n = len(self.rows)
+            held = list(self.positions.values())
+            runs = column_runs(held)
+            # Header cells of the held columns first: if a column was inserted
+            # or moved, positions are stale and only a full sync is safe.
+            ranges = column_run_ranges(runs, 1, 1) + column_run_ranges(runs, n + 2)
+            for name in tracked:
+                letter = col_letter(self.positions[name] + 1)
+                ranges.append(f"{letter}2:{letter}{n + 1}")
+            results = ws.batch_get(ranges)
+            api_calls += 1
+            fetched = [list(r) for r in results]
+            n_bytes = _payload_bytes(fetched)
+
+            header = stack_column_runs(fetched[:len(runs)], runs, held)
+            if [str(v).strip() for v in (header[0] if len(header) else [])] != self.header:
+                self._projection.positions = None
+                return self._full_sync(ws, revision, api_calls)
+            fetched = fetched[len(runs):]
+            appended = stack_column_runs(fetched[:len(runs)], runs, held).tolist()
+            # Rows are positional (_sheet_row), so blank rows inside the appended
+            # range stay, exactly as in a full sync; only trailing ones go.
+            tail = appended
+            while tail and not any(str(v).strip() for v in tail[-1]):
+                tail.pop()
+            columns = {}
+            for name, values in zip(tracked, fetched[len(runs):]):
+                flat = [row[0] if row else "" for row in values]
+                columns[name] = flat + [""] * (n - len(flat))
+
+            if identity_cols:
+                id_idx = [self.header.index(c) for c in identity_cols]
+                identity = zip(*(columns[c] for c in identity_cols))
+                if any(tuple(row[i] for i in id_idx) != key
+                       for row, key in zip(self.rows, identity)):
+                    return self._full_sync(ws, revision, api_calls)
+
+            changed = set()
+            for name, values in columns.items():
+                c = self.header.index(name)
+                for i, (row, v) in enumerate(zip(self.rows, values)):
+                    if row[c] != v:
+                        row[c] = v
+                        changed.add(i)
+            self.rows.extend(tail)
+
+            self._revision = revision
+            self.metrics["rows_changed"] = len(changed) + len(tail)
+            self._record("delta", len(tail) + n * bool(columns), n_bytes, api_calls)
+            if changed or tail:
+                self.version += 1
+                return True
+            return False
+
+    def column_positions(self, ws):
+        """{header name: 1-based column} from the synced projection, reading
+        row 1 only if no sync has happened yet."""
+        with self._lock:
+            positions = self.positions
+        if positions is None:
+            positions = resolve_columns([c.strip() for c in ws.row_values(1)], lambda name: True)
+        return {name: c + 1 for name, c in positions.items()}
+
+    def values(self):
+        """Header + rows, in the shape get_all_values() returns."""
+        with self._lock:
+            if self.header is None:
+                return []
+            return [list(self.header)] + [list(r) for r in self.rows]
+
+
+@st.cache_resource
+def get_deficiency_sync():
+    return DeficiencySheetSync()
 
 
 # =========================================================================
 # HELPERS — Google Sheet update
 # =========================================================================
-def update_feedback_column(edited_df):
-    header = sheet.row_values(1)
+WRITE_BACK_COLS = ["Feedback", "User Feedback/Remark", "Head", "Action By", "Sub Head", TIMESTAMP_COL_NAME]
 
-    def col_idx(name):
-        try:
-            return header.index(name) + 1
-        except ValueError:
-            st.warning(f"Column '{name}' not found in sheet header.")
-            return None
 
-    feedback_col = col_idx("Feedback")
-    remark_col = col_idx("User Feedback/Remark")
-    head_col = col_idx("Head")
-    action_col = col_idx("Action By")
-    subhead_col = col_idx("Sub Head")
-    timestamp_col = col_idx(TIMESTAMP_COL_NAME)
+def row_version_of(values):
+    """Version tag of one row: a hash of its WRITE_BACK_COLS cell texts, in order."""
+    return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).hexdigest()
 
-    required = (feedback_col, remark_col, head_col, action_col, subhead_col, timestamp_col)
-    if None in required:
+
+def row_versions(df):
+    """row_version_of() for every row of `df` (missing cells count as "")."""
+    cells = pd.DataFrame(
+        {c: df[c].astype(object).where(df[c].notna(), "").astype(str) if c in df.columns else ""
+         for c in WRITE_BACK_COLS},
+        index=df.index,
+    )
+    joined = cells[WRITE_BACK_COLS[0]].str.cat([cells[c] for c in WRITE_BACK_COLS[1:]], sep="\x1f")
+    return joined.map(lambda text: hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest())
+
+
+def merge_cell_ranges(cells):
+    """{(row, col): value} -> values_batch_update payloads.
+
+    Cells that touch within a row become one horizontal run; runs covering the
+    same columns on consecutive rows are stacked into a single block range.
+    """
+    by_row = {}
+    for (r, c), v in cells.items():
+        by_row.setdefault(r, {})[c] = v
+
+    blocks = []        # [first_row, last_row, first_col, last_col, values]
+    open_blocks = {}   # (first_col, last_col) -> index of the block ending on the previous row
+    for r in sorted(by_row):
+        row = by_row[r]
+        cols = sorted(row)
+        start = 0
+        for i in range(1, len(cols) + 1):
+            if i < len(cols) and cols[i] == cols[i - 1] + 1:
+                continue
+            c0, c1 = cols[start], cols[i - 1]
+            values = [row[c] for c in range(c0, c1 + 1)]
+            b = open_blocks.get((c0, c1))
+            if b is not None and blocks[b][1] == r - 1:
+                blocks[b][1] = r
+                blocks[b][4].append(values)
+            else:
+                open_blocks[(c0, c1)] = len(blocks)
+                blocks.append([r, r, c0, c1, [values]])
+            start = i
+
+    return [
+        {
+            "range": f"{gspread.utils.rowcol_to_a1(r0, c0)}:{gspread.utils.rowcol_to_a1(r1, c1)}",
+            "values": values,
+        }
+        for r0, r1, c0, c1, values in blocks
+    ]
+
+
+def build_feedback_writes(edited_df, current_df, positions):
+    """Cells to write for the submitted rows: only those whose value differs
+    from `current_df`. Returns ({(sheet_row, sheet_col): value},
+    {sheet_row: {column: value}}, {sheet_row: expected _row_version}).
+    No Streamlit calls, no I/O."""
+    rows = edited_df["_sheet_row"].astype(int).to_numpy()
+    new = pd.DataFrame(
+        {c: edited_df[c].to_numpy() if c in edited_df.columns else "" for c in WRITE_BACK_COLS[:-1]},
+        index=rows,
+    ).astype(object).fillna("").astype(str)
+    now_ist = datetime.now(pytz.timezone('Asia/Kolkata')).strftime("%d-%m-%Y %H:%M:%S IST")
+    new[TIMESTAMP_COL_NAME] = np.where(new["Feedback"].str.strip() != "", now_ist, "")
+
+    current = current_df.set_index("_sheet_row")
+    old = current.reindex(rows)[WRITE_BACK_COLS].astype(object).fillna("").astype(str)
+    changed_at = np.argwhere(new.to_numpy() != old.to_numpy())
+
+    sheet_cols = [positions[c] for c in WRITE_BACK_COLS]
+    values = new.to_numpy()
+    cells, local_edits = {}, {}
+    for i, j in changed_at:
+        r, v = int(rows[i]), values[i, j]
+        cells[(r, sheet_cols[j])] = v
+        local_edits.setdefault(r, {})[WRITE_BACK_COLS[j]] = v
+    expected = current["_row_version"].reindex(list(local_edits)).dropna().to_dict()
+    return cells, local_edits, expected
+
+
+def update_feedback_column(edited_df):
+    """Queue the submitted rows for writing; the sheet is updated by the
+    background FeedbackWriteQueue and the rows show locally right away.
+    Returns False if nothing could be queued."""
+    positions = get_deficiency_sync().column_positions(sheet)
+    missing = [name for name in WRITE_BACK_COLS if name not in positions]
+    for name in missing:
+        st.warning(f"Column '{name}' not found in sheet header.")
+    if missing:
         st.error("Cannot update: one or more required columns missing in Google Sheet.")
-        return
+        return False
 
-    updates = []
-    ist = pytz.timezone('Asia/Kolkata')
-
-    for _, row in edited_df.iterrows():
-        r = int(row["_sheet_row"])
-        def a1(c):
-            return gspread.utils.rowcol_to_a1(r, c)
-
-        fv = row.get("Feedback", "") or ""
-        rv = row.get("User Feedback/Remark", "") or ""
-        hv = row.get("Head", "") or ""
-        av = row.get("Action By", "") or ""
-        sv = row.get("Sub Head", "") or ""
-
-        timestamp_value = ""
-        if fv.strip():
-            now_ist = datetime.now(ist)
-            timestamp_value = now_ist.strftime("%d-%m-%Y %H:%M:%S IST")
-
-        updates.extend([
-            {"range": a1(feedback_col), "values": [[fv]]},
-            {"range": a1(remark_col), "values": [[rv]]},
-            {"range": a1(head_col), "values": [[hv]]},
-            {"range": a1(action_col), "values": [[av]]},
-            {"range": a1(subhead_col), "values": [[sv]]},
-            {"range": a1(timestamp_col), "values": [[timestamp_value]]},
-        ])
+    cells, local_edits, expected = build_feedback_writes(edited_df, session_df(), positions)
+    if not cells:
+        st.info("ℹ️ Sheet already has these values; nothing to write.")
+        return True
+
+    try:
+        submission_id = get_write_queue().submit(
+            cells, expected, [positions[c] for c in WRITE_BACK_COLS]
+        )
+    except Exception as e:
+        st.error(f"Could not queue the update: {str(e)}")
+        return False
+    record_local_edits(local_edits)
+    st.session_state.pending_writes[submission_id] = local_edits
+    st.success(f"Queued {len(local_edits)} record(s) including timestamps ({len(cells)} cell(s)).")
+    return True
+
+
+def dirty_submission_frame(dirty, current_df):
+    """Rows to submit for the remarks in `dirty` ({sheet_row: remark}): a
+    non-blank remark moves into Feedback and the remark field is cleared."""
+    base = current_df.set_index("_sheet_row")
+    rows = [r for r in dirty if r in base.index]
+    diffs = base.loc[rows, WRITE_BACK_COLS[:-1]].astype(object)
+    remarks = pd.Series([dirty[r] for r in rows], index=rows, dtype=object).fillna("").astype(str)
+    has_remark = (remarks.str.strip() != "").to_numpy()
+    diffs["Feedback"] = np.where(has_remark, remarks.str.strip(), diffs["Feedback"])
+    diffs["User Feedback/Remark"] = np.where(has_remark, "", remarks)
+    return diffs.rename_axis("_sheet_row").reset_index()
 
-        s = st.session_state.df
-        mask = s["_sheet_row"] == r
-        s.loc[mask, "Feedback"] = fv
-        s.loc[mask, "User Feedback/Remark"] = rv
-        s.loc[mask, "Head"] = hv
-        s.loc[mask, "Action By"] = av
-        s.loc[mask, "Sub Head"] = sv
-        s.loc[mask, TIMESTAMP_COL_NAME] = timestamp_value
 
-    if updates:
+# =========================================================================
+# HELPERS — write-behind queue
+# =========================================================================
+class FeedbackWriteQueue:
+    """Process-wide write-behind queue for feedback submissions.
+
+    submit() journals the cells and returns at once; a single worker thread
+    waits WRITE_COALESCE_SECONDS for other sessions' submissions and writes
+    everything pending with one values_batch_update, recording the outcome per
+    submission. Quota and transient errors put the batch back at the front of
+    the queue with backoff; other API errors fail the batch. With `db_path`
+    the journal is kept in SQLite and unfinished submissions are replayed on
+    start-up.
+
+    Writes are compare-and-set per row: a submission carries the _row_version
+    each row had when the user saw it, and one batch_get of the batch's rows
+    just before writing checks those versions. Rows that changed in the sheet
+    meanwhile (including by an earlier submission in the same batch) are
+    skipped and reported back as conflicts; the rest of the submission is
+    still written.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    TRANSIENT_ERRORS = (
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError,
+    )
+
+    def __init__(self, open_worksheet, db_path=None):
+        self._open_worksheet = open_worksheet
+        self._subs = {}        # id -> {"cells", "expected", "cols", "status", "detail", "conflicts", ...}
+        self._pending = []     # ids waiting for the worker, oldest first
+        self._cond = threading.Condition()
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS write_journal ("
+                    "id TEXT PRIMARY KEY, created REAL NOT NULL, cells TEXT NOT NULL)"
+                )
+                for sub_id, payload in self._db.execute(
+                    "SELECT id, cells FROM write_journal ORDER BY created"
+                ).fetchall():
+                    payload = json.loads(payload)
+                    if isinstance(payload, list):       # journalled before row versions existed
+                        payload = {"cells": payload}
+                    self._add(
+                        sub_id, {(r, c): v for r, c, v in payload["cells"]},
+                        {int(r): v for r, v in payload.get("expected", {}).items()},
+                        payload.get("cols", []),
+                    )
+            except sqlite3.Error:
+                self._db = None  # keep queueing in memory only
+        threading.Thread(target=self._run, name="feedback-writer", daemon=True).start()
+
+    def _add(self, sub_id, cells, expected, cols):
+        self._subs[sub_id] = {
+            "cells": cells, "expected": expected, "cols": cols, "status": "queued",
+            "detail": "", "conflicts": [], "attempts": 0, "finished": None,
+        }
+        self._pending.append(sub_id)
+
+    def _journal(self, sql, params):
+        if self._db is None:
+            return
         try:
-            sheet.spreadsheet.values_batch_update({
-                "valueInputOption": "USER_ENTERED",
-                "data": updates
-            })
-            st.success(f"Updated {len(updates) // 6} record(s) including timestamps.")
-        except Exception as e:
-            st.error(f"Google Sheets update failed: {str(e)}")
+            self._db.execute(sql, params)
+            self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    def submit(self, cells, expected=None, version_cols=None):
+        """Queue {(sheet_row, sheet_col): value}; returns a submission id.
+
+        `expected` maps sheet rows to the _row_version the caller based its
+        edit on, and `version_cols` lists the sheet columns (WRITE_BACK_COLS
+        order) that version covers. Rows without an expected version are
+        written unconditionally.
+        """
+        sub_id = uuid.uuid4().hex
+        expected, version_cols = dict(expected or {}), list(version_cols or [])
+        payload = json.dumps({
+            "cells": [[r, c, v] for (r, c), v in cells.items()],
+            "expected": expected,
+            "cols": version_cols,
+        }, ensure_ascii=False)
+        with self._cond:
+            self._prune()
+            self._journal("INSERT INTO write_journal VALUES (?, ?, ?)", (sub_id, time.time(), payload))
+            self._add(sub_id, dict(cells), expected, version_cols)
+            self._cond.notify()
+        return sub_id
+
+    def status(self, sub_id):
+        """{'status': queued|writing|retrying|done|conflict|failed, 'detail',
+        'conflicts': [sheet rows not written], 'attempts'} or None."""
+        with self._cond:
+            sub = self._subs.get(sub_id)
+            if sub is None:
+                return None
+            return {k: sub[k] for k in ("status", "detail", "conflicts", "attempts")}
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _prune(self, keep_seconds=3600):
+        cutoff = time.time() - keep_seconds
+        for sub_id in [s for s, sub in self._subs.items() if sub["finished"] and sub["finished"] < cutoff]:
+            del self._subs[sub_id]
+
+    def _finish(self, batch, status, detail=""):
+        with self._cond:
+            for sub_id in batch:
+                sub = self._subs[sub_id]
+                final = status
+                if status == "done" and sub["conflicts"] and len(sub["conflicts"]) == len(sub["expected"]):
+                    final = "conflict"
+                sub.update(status=final, detail=detail, finished=time.time())
+                self._journal("DELETE FROM write_journal WHERE id = ?", (sub_id,))
+
+    def _compare_and_merge(self, ws, batch):
+        """Read the batch's rows, drop rows whose version moved, and return
+        the cells left to write. Records conflicts on each submission."""
+        subs = [self._subs[sub_id] for sub_id in batch]
+        # Without version columns there is nothing to compare: written unconditionally
+        rows = sorted({r for sub in subs if sub["cols"] for r in sub["expected"]})
+        current = {}
+        if rows:
+            cols = [c for sub in subs for c in sub["cols"]]
+            c_lo, c_hi = min(cols), max(cols)
+            runs, start = [], rows[0]
+            for prev, r in zip(rows, rows[1:] + [None]):
+                if r != prev + 1:
+                    runs.append((start, prev))
+                    start = r
+            fetched = ws.batch_get([
+                f"{gspread.utils.rowcol_to_a1(r0, c_lo)}:{gspread.utils.rowcol_to_a1(r1, c_hi)}"
+                for r0, r1 in runs
+            ])
+            for (r0, r1), block in zip(runs, fetched):
+                block = list(block)
+                for k in range(r1 - r0 + 1):
+                    values = block[k] if k < len(block) else []
+                    current[r0 + k] = {c_lo + j: v for j, v in enumerate(values)}
+
+        merged = {}
+        for sub in subs:
+            conflicts = [
+                r for r, want in sub["expected"].items()
+                if sub["cols"] and row_version_of([current.get(r, {}).get(c, "") for c in sub["cols"]]) != want
+            ]
+            skipped = set(conflicts)
+            for (r, c), v in sub["cells"].items():
+                if r in skipped:
+                    continue
+                merged[(r, c)] = v
+                current.setdefault(r, {})[c] = v   # later submissions compare against this write
+            with self._cond:
+                sub["conflicts"] = sorted(conflicts)
+        return merged
+
+    def _is_transient(self, e):
+        """Worth retrying: throttling / server errors and dropped connections."""
+        if isinstance(e, gspread.exceptions.APIError):
+            return getattr(e.response, "status_code", None) in self.RETRY_STATUS
+        return isinstance(e, self.TRANSIENT_ERRORS)
+
+    def _run(self):
+        delay = SHEETS_RETRY_BASE_SECONDS
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(WRITE_COALESCE_SECONDS)  # let concurrent submissions pile up
+
+            with self._cond:
+                batch, self._pending = self._pending, []
+                for sub_id in batch:
+                    sub = self._subs[sub_id]
+                    sub["status"] = "writing"
+                    sub["attempts"] += 1
+
+            try:
+                ws = self._open_worksheet()
+                merged = self._compare_and_merge(ws, batch)
+                if merged:
+                    ws.spreadsheet.values_batch_update({
+                        "valueInputOption": "USER_ENTERED",
+                        "data": merge_cell_ranges(merged),
+                    })
+            except Exception as e:
+                if not self._is_transient(e):
+                    # Anything else would fail again the same way, and retrying
+                    # it would hold every later submission behind this batch.
+                    self._finish(batch, "failed", str(e))
+                    continue
+                with self._cond:
+                    for sub_id in batch:
+                        self._subs[sub_id].update(status="retrying", detail=str(e))
+                    self._pending[:0] = batch
+                time.sleep(delay + random.uniform(0, delay))
+                delay = min(delay * 2, WRITE_RETRY_MAX_SECONDS)
+                continue
+
+            delay = SHEETS_RETRY_BASE_SECONDS
+            self._finish(batch, "done")
+
+
+@st.cache_resource
+def get_write_queue():
+    pool = get_sheets_client()
+    sheet_id = st.secrets["google_sheets"]["sheet_id"]
+    sheet_name = st.secrets["google_sheets"]["sheet_name"]
+    return FeedbackWriteQueue(lambda: pool.worksheet(sheet_id, sheet_name), WRITE_JOURNAL_PATH)
+
+
+# Start the worker (and journal replay) on app start-up rather than on the
+# first submit. It is created here, not next to connect_to_gsheet(), because
+# its thread uses the write helpers defined above.
+get_write_queue()
+
+
+def drop_local_edits(edits):
+    """Undo record_local_edits() for cells that still hold the given values."""
+    overlay = st.session_state.df_overlay
+    for sheet_row, values in edits.items():
+        row = overlay.get(int(sheet_row), {})
+        for col, value in values.items():
+            if row.get(col) == value:
+                del row[col]
+        if not row:
+            overlay.pop(int(sheet_row), None)
+    st.session_state.overlay_df = None
+
+
+def render_write_status():
+    """Progress of this session's queued submissions (polled while any are open)."""
+    queue = get_write_queue()
+    for sub_id, edits in list(st.session_state.pending_writes.items()):
+        info = queue.status(sub_id) or {
+            "status": "failed", "detail": "lost after a restart", "conflicts": [], "attempts": 0
+        }
+        n = len(edits)
+        if info["status"] in ("done", "conflict"):
+            conflicts = info["conflicts"]
+            if len(conflicts) < n:
+                st.success(f"✅ {n - len(conflicts)} record(s) saved to Google Sheet.")
+            if conflicts:
+                st.warning(
+                    f"⚠️ Not saved — changed by someone else since you loaded them: sheet row(s) "
+                    f"{', '.join(map(str, conflicts))}. Refresh to see their latest values and re-enter."
+                )
+                drop_local_edits({r: edits[r] for r in conflicts if r in edits})
+            del st.session_state.pending_writes[sub_id]
+        elif info["status"] == "failed":
+            st.error(f"❌ Saving {n} record(s) failed: {info['detail']}")
+            drop_local_edits(edits)
+            del st.session_state.pending_writes[sub_id]
+        elif info["status"] == "retrying":
+            st.warning(f"⏳ {n} record(s) waiting for Google Sheets quota (attempt {info['attempts']}).")
+        else:
+            st.info(f"💾 {n} record(s) {info['status']}...")
 
 
 # =========================================================================
 # HELPERS — filters
 # =========================================================================
+FILTER_INDEX_COLS = ["Type of Inspection", "Location", "Head", "Sub Head", "Status"]
+
+
+class FilterIndex:
+    """Inverted index over one snapshot: for every value of each indexed
+    column, the row positions that hold it (rows sorted by category code, so
+    each value's rows are one contiguous slice). A multiselect resolves to a
+    boolean row mask in time proportional to the rows it matches, and
+    several filters combine by mask intersection."""
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self._postings = {}
+        for col in columns:
+            values = df[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(str).astype("category")
+            codes = values.cat.codes.to_numpy()
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(values.cat.categories) + 1))
+            self._postings[col] = (pd.Index(values.cat.categories), order, bounds)
+
+    def mask(self, col, selected):
+        categories, order, bounds = self._postings[col]
+        out = np.zeros(self.n_rows, dtype=bool)
+        for code in categories.get_indexer(list(selected)):
+            if code >= 0:
+                out[order[bounds[code]:bounds[code + 1]]] = True
+        return out
+
+
+def indexed_filter_mask(df, selections):
+    """Row mask over session_df() for {column: selected values}, resolved on
+    the snapshot's FilterIndex. Rows this session has edited locally are
+    re-checked against their current values."""
+    snapshot = st.session_state.snapshot
+    index = snapshot.derived("filter_index", lambda d: FilterIndex(d, FILTER_INDEX_COLS))
+    edited = np.array([], dtype=int)
+    if df is not snapshot.df and st.session_state.df_overlay:
+        edited = pd.Index(df["_sheet_row"]).get_indexer(list(st.session_state.df_overlay))
+        edited = edited[edited >= 0]
+
+    mask = np.ones(len(df), dtype=bool)
+    for col, selected in selections.items():
+        col_mask = index.mask(col, selected)
+        if len(edited):
+            col_mask[edited] = df[col].iloc[edited].isin(list(selected)).to_numpy()
+        mask &= col_mask
+    return mask
+
+
+OFFICER_COLS = ["Inspection By", "Action By"]
+
+
+def build_officer_index(df):
+    """Pre-exploded officer lookup: {column: long table of (officer, _sheet_row)},
+    one row per name in each comma-separated Inspection By / Action By cell.
+    Cells are split once per distinct value and joined back to rows on the
+    category code. Names keep the spacing of the raw split, matching the
+    comparison apply_common_filters has always made."""
+    index = {}
+    for col in OFFICER_COLS:
+        cells = df[col]
+        if not isinstance(cells.dtype, pd.CategoricalDtype):
+            cells = cells.astype(str).astype("category")
+        names = pd.Series(cells.cat.categories, dtype=object).str.split(",").explode()
+        per_code = pd.DataFrame({"code": names.index.to_numpy(), "officer": names.to_numpy()})
+        rows = pd.DataFrame({"code": cells.cat.codes.to_numpy(), "_sheet_row": df["_sheet_row"].to_numpy()})
+        index[col] = rows.merge(per_code, on="code")[["officer", "_sheet_row"]]
+    return index
+
+
+def officer_rows(officer_index, col, selected):
+    """_sheet_row values whose `col` cell names any of the selected officers."""
+    long = officer_index[col]
+    wanted = {s.strip() for s in selected}
+    return long.loc[long["officer"].isin(wanted), "_sheet_row"].unique()
+
+
+SEARCH_INDEX_COLS = [
+    "Date of Inspection", "Type of Inspection", "Head", "Sub Head", "Location",
+    "Deficiencies Noted", "Inspection By", "Action By", "Feedback",
+    "User Feedback/Remark", TIMESTAMP_COL_NAME
+]
+_SEARCH_TOKEN_PATTERN = r"\w+"
+
+
+# Joins the columns in search_text_of(). Columns are whitespace-normalized
+# before joining, so it survives; it is not a word character (field starts
+# count as word starts) and normalize_search_query() strips it via split().
+SEARCH_COL_SEPARATOR = "\x1f"
+
+
+def normalize_search_query(query):
+    return " ".join(str(query).lower().split())
+
+
+def search_text_of(df):
+    """One lower-cased line of searchable text per row: the SEARCH_INDEX_COLS
+    cells, each whitespace-normalized on its own, joined by
+    SEARCH_COL_SEPARATOR, which no normalized query contains."""
+    parts = []
+    for col in SEARCH_INDEX_COLS:
+        if col not in df.columns:
+            continue
+        cells = df[col]
+        if is_datetime64_any_dtype(cells):
+            cells = cells.dt.strftime("%Y-%m-%d")
+        cells = cells.astype(object).where(cells.notna(), "").astype(str)
+        parts.append(cells.str.replace(r"\s+", " ", regex=True).str.lower())
+    if not parts:
+        return pd.Series("", index=df.index)
+    return parts[0].str.cat(parts[1:], sep=SEARCH_COL_SEPARATOR) if len(parts) > 1 else parts[0]
+
+
+class SearchIndex:
+    """Inverted word index over one snapshot's searchable text.
+
+    Every row's text is split into word tokens; the sorted vocabulary maps
+    each token to a contiguous run of row positions. A query is answered by
+    finding the vocabulary entries that contain (or start with) each query
+    word, intersecting their rows, and verifying the literal query against
+    the few candidates — so cost follows the hit count and vocabulary size,
+    not the number of rows.
+    """
+
+    def __init__(self, df):
+        self.sheet_rows = df["_sheet_row"].to_numpy()
+        self.texts = search_text_of(df).reset_index(drop=True)
+
+        tokens = self.texts.str.findall(_SEARCH_TOKEN_PATTERN).explode().dropna()
+        codes, vocab = pd.factorize(tokens, sort=True)
+        rows = tokens.index.to_numpy(dtype=np.int64)
+        order = np.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+        codes, self._postings = codes[keep], rows[keep]
+
+        self.vocab = pd.Series(np.asarray(vocab, dtype=object))
+        self._vocab_sorted = self.vocab.to_numpy()
+        self._starts = np.searchsorted(codes, np.arange(len(vocab) + 1))
+
+    def _rows_for_codes(self, token_codes):
+        if len(token_codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        runs = [self._postings[self._starts[c]:self._starts[c + 1]] for c in token_codes]
+        return np.unique(np.concatenate(runs))
+
+    def _rows_for_word(self, word, prefix):
+        if prefix:
+            lo = np.searchsorted(self._vocab_sorted, word, side="left")
+            hi = np.searchsorted(self._vocab_sorted, word + "\U0010ffff", side="left")
+            token_codes = np.arange(lo, hi)
+        else:
+            token_codes = np.flatnonzero(self.vocab.str.contains(word, regex=False).to_numpy())
+        return self._rows_for_codes(token_codes)
+
+    def search(self, query, prefix=False):
+        """_sheet_row values whose text contains the query (case-insensitive,
+        literal). With prefix=True the match must start at a word boundary."""
+        query = normalize_search_query(query)
+        if not query:
+            return self.sheet_rows
+        words = re.findall(_SEARCH_TOKEN_PATTERN, query)
+        if words:
+            candidates = self._rows_for_word(words[0], prefix and query.startswith(words[0]))
+            for word in words[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, self._rows_for_word(word, False), assume_unique=True)
+        else:
+            candidates = np.arange(len(self.texts))
+        hits = match_search_text(self.texts.iloc[candidates], query, prefix)
+        return self.sheet_rows[candidates[hits]]
+
+
+def match_search_text(texts, query, prefix=False):
+    """Boolean array: which of the (already normalized) texts contain the query."""
+    if prefix:
+        return texts.str.contains(r"(?<!\w)" + re.escape(query), regex=True).to_numpy(dtype=bool)
+    return texts.str.contains(query, regex=False).to_numpy(dtype=bool)
+
+
+GRID_PAGE_SIZES = [25, 50, 100, 200]
+
+
+def grid_sort_order(df, column, descending=False):
+    """Row positions of `df` in display order for the editor grid (blanks
+    last either way). Categorical columns sort on a rank of their categories,
+    so only the category list is compared, not every cell."""
+    if column is None or column not in df.columns:
+        return np.arange(len(df))
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        cats = pd.Index(values.cat.categories.astype(str))
+        rank = np.empty(len(cats), dtype=np.int64)
+        rank[cats.argsort(kind="stable")] = np.arange(len(cats))
+        codes = values.cat.codes.to_numpy()
+        key = pd.Series(np.where(codes >= 0, rank[codes], -1), dtype="int64")
+        key = key.where((codes >= 0) & (cats.to_numpy()[codes] != BLANK_CATEGORY))
+    else:
+        key = values.reset_index(drop=True)
+        if not (is_numeric_dtype(key) or is_datetime64_any_dtype(key)):
+            key = key.where(key.astype(str).str.strip() != "")
+    return key.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+
+
 def apply_common_filters(df, prefix=""):
     default_to_date = date.today()
     default_from_date = default_to_date - timedelta(days=2)
@@ -1094,17 +2586,14 @@ def apply_common_filters(df, prefix=""):
 
     out = df.copy()
 
+    officer_index = st.session_state.snapshot.derived("officer_index", build_officer_index)
     if st.session_state.get(prefix + "insp"):
         sel = st.session_state[prefix + "insp"]
-        out = out[out["Inspection By"].apply(
-            lambda x: any(s.strip() in str(x).split(",") for s in sel)
-        )]
+        out = out[out["_sheet_row"].isin(officer_rows(officer_index, "Inspection By", sel))]
 
     if st.session_state.get(prefix + "action"):
         sel = st.session_state[prefix + "action"]
-        out = out[out["Action By"].apply(
-            lambda x: any(s.strip() in str(x).split(",") for s in sel)
-        )]
+        out = out[out["_sheet_row"].isin(officer_rows(officer_index, "Action By", sel))]
 
     if st.session_state.get(prefix + "from_date") and st.session_state.get(prefix + "to_date"):
         from_date = st.session_state[prefix + "from_date"]
@@ -1122,217 +2611,360 @@ def apply_common_filters(df, prefix=""):
     return out
 
 
+# =========================================================================
+# HELPERS — analytics rollup
+# =========================================================================
+DEPT_MAP = {
+    "ENGINEERING": "ENGINEERING", "GSU": "GSU",
+    "ELECT/G": "ELECT/G", "ELECTG": "ELECT/G",
+    "ELECT/TRD": "ELECT/TRD", "ELECT/TRO": "ELECT/TRO",
+    "OPTG": "OPTG", "OPERATING": "OPTG",
+    "SIGNAL & TELECOM": "SIGNAL & TELECOM",
+    "MECHANICAL": "MECHANICAL", "COMMERCIAL": "COMMERCIAL",
+    "C&W": "C&W", "SECURITY": "SECURITY", "PERSONNEL": "PERSONNEL",
+    "MEDICAL": "MEDICAL", "FINANCE": "FINANCE", "STORE": "STORE",
+}
+# Location_kind follows from Location_clean, so it adds no cells; it is kept
+# so the tab can slice by location type without re-deriving it.
+ROLLUP_DIMS = ["Day", "Head_std", "Location_clean", "Location_kind", "Status"]
+
+
+def clean_name(text):
+    if pd.isna(text):
+        return "UNKNOWN"
+    s = str(text).strip()
+    s = re.sub(r"[\*\-\_\'\"]", "", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s.upper()
+
+
+def rollup_keys(df):
+    """Per-row rollup coordinates (ROLLUP_DIMS) indexed by _sheet_row; rows
+    without a parseable inspection date are left out. Name cleaning runs once
+    per distinct Head / Location value."""
+    dates = df["Date of Inspection"]   # datetime64 since load
+    keep = dates.notna().to_numpy()
+    df, dates = df[keep], dates[keep]
+    head_clean = _per_unique(df["Head"].astype(object), lambda u: u.map(clean_name))
+    status = df["Status"].astype(object).fillna("Pending").replace({"": "Pending", "NA": "Pending"})
+    status = status.astype(str).str.strip().str.upper().map({
+        "PENDING": "Pending", "RESOLVED": "Resolved", "CLOSED": "Resolved"
+    }).fillna("Pending")
+    return pd.DataFrame({
+        "Day": dates.dt.normalize().to_numpy(),
+        "Head_std": pd.Series(head_clean).map(DEPT_MAP).fillna("UNKNOWN").to_numpy(),
+        "Location_clean": df["Location"].astype(object).fillna("").to_numpy(),   # canonical at load
+        "Location_kind": df["Location_kind"].astype(object).fillna("other").to_numpy(),
+        "Status": status.to_numpy(),
+    }, index=pd.Index(df["_sheet_row"].to_numpy(), name="_sheet_row"))
+
+
+def _count_cells(keys):
+    return keys.groupby(ROLLUP_DIMS, sort=False).size()
+
+
+def _changed_rows(old, new):
+    """_sheet_row values whose rollup coordinates differ between two key frames."""
+    rows = old.index.union(new.index)
+    a, b = old.reindex(rows), new.reindex(rows)
+    same = ((a == b) | (a.isna() & b.isna())).all(axis=1)
+    return rows[~same.to_numpy()]
+
+
+def apply_rollup_delta(cube, old, new):
+    """`cube` moved from the `old` key rows to the `new` ones (same _sheet_rows)."""
+    cube = cube.add(_count_cells(new), fill_value=0).sub(_count_cells(old), fill_value=0)
+    return cube[cube > 0].astype("int64")
+
+
+class AnalyticsRollup:
+    """Materialized Day × Head_std × Location_clean × Status → Count cube.
+
+    The Analytics tab slices this instead of grouping raw rows, so its cost
+    follows the number of occupied cells, not the sheet size. Each snapshot
+    gets its cube through snapshot.derived(); the cube is built by diffing the
+    new snapshot's row coordinates against the last one built and moving only
+    the rows whose coordinates changed. Days rather than months, because the
+    tab's date filter is day-level.
+    """
+
+    def __init__(self):
+        self._keys = None
+        self._cube = None
+        self._lock = threading.Lock()
+
+    def build(self, df):
+        keys = rollup_keys(df)
+        with self._lock:
+            if self._keys is None:
+                cube = _count_cells(keys)
+            else:
+                changed = _changed_rows(self._keys, keys)
+                cube = apply_rollup_delta(
+                    self._cube,
+                    self._keys.loc[self._keys.index.intersection(changed)],
+                    keys.loc[keys.index.intersection(changed)],
+                )
+            self._keys, self._cube = keys, cube
+        return keys, cube
+
+
+@st.cache_resource
+def get_analytics_rollup():
+    return AnalyticsRollup()
+
+
+def analytics_cube():
+    """This session's rollup as a flat frame (ROLLUP_DIMS + Count): the shared
+    snapshot cube, with rows this session edited moved to their new cells."""
+    snapshot = st.session_state.snapshot
+    keys, cube = snapshot.derived("analytics_rollup", get_analytics_rollup().build)
+    overlay = st.session_state.df_overlay
+    if overlay and not cube.empty:
+        edited = session_df()
+        edited = edited[edited["_sheet_row"].isin(list(overlay))]
+        new = rollup_keys(edited)
+        changed = _changed_rows(keys.loc[keys.index.intersection(new.index)], new)
+        if len(changed):
+            cube = apply_rollup_delta(
+                cube, keys.loc[keys.index.intersection(changed)], new.loc[new.index.intersection(changed)]
+            )
+    return cube.rename("Count").reset_index()
+
+
 # =========================================================================
 # HELPERS — Excel export (shared by both download buttons)
 # =========================================================================
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXCEL_MAX_COL_WIDTH = 50
+EXCEL_STATUS_COLORS = {"pending": "FF0000", "resolved": "008000"}   # red / green
+
+
+def _excel_cell_values(series):
+    """Column values as a list ready for openpyxl: NaN/NaT become None."""
+    values = series.astype(object).where(series.notna(), None)
+    return values.tolist()
+
+
+def _excel_col_widths(export_df):
+    """Column widths from the longest rendered value per column (header included)."""
+    widths = []
+    for col in export_df.columns:
+        cells = export_df[col]
+        if col == "Date of Inspection":
+            longest = 10 if cells.notna().any() else 0          # DD-MM-YYYY
+        else:
+            text = cells[cells.notna()].astype(str)
+            longest = int(text.str.len().max()) if len(text) else 0
+        longest = max(longest, len(str(col)))
+        widths.append(longest + 2 if longest < EXCEL_MAX_COL_WIDTH else EXCEL_MAX_COL_WIDTH)
+    return widths
+
+
 def build_excel_export(export_df, sheet_name):
-    """Build a styled Excel workbook (bytes buffer) from an export-ready DataFrame.
+    """Build a styled Excel workbook (bytes) from an export-ready DataFrame.
     Expects a 'Date of Inspection' column (date) and a plain-text 'Status' column
     ('Pending' / 'Resolved') with no emoji prefix.
+
+    Rows are streamed through a write-only workbook with every cell styled as
+    it is emitted, so the sheet is never held in memory or walked twice.
     """
+    openpyxl = _lazy_import("openpyxl")
+    styles = _lazy_import("openpyxl.styles")
+    WriteOnlyCell = _lazy_import("openpyxl.cell").WriteOnlyCell
+    thin = styles.Side(style="thin")
+    border = styles.Border(left=thin, right=thin, top=thin, bottom=thin)
+    alignment = styles.Alignment(wrap_text=True, vertical="top")
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for idx, width in enumerate(_excel_col_widths(export_df), start=1):
+        ws.column_dimensions[col_letter(idx)].width = width
+
+    # One registered style per cell kind; assigning a style by name skips the
+    # per-cell font/border hashing openpyxl does for ad-hoc style objects.
+    def register(name, font=None, number_format="General"):
+        style = styles.NamedStyle(name=name, font=font or styles.Font(), border=border,
+                                  alignment=alignment, number_format=number_format)
+        wb.add_named_style(style)
+        return name
+
+    text_style = register("export_text")
+    header_style = register("export_header", font=styles.Font(bold=True))
+    date_style = register("export_date", number_format="DD-MM-YYYY")
+    status_styles = {
+        k: register(f"export_{k}", font=styles.Font(color=color)) for k, color in EXCEL_STATUS_COLORS.items()
+    }
+
+    def styled(value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    ws.append([styled(str(col), header_style) for col in export_df.columns])
+
+    columns, col_styles = [], []
+    for col in export_df.columns:
+        columns.append(_excel_cell_values(export_df[col]))
+        if col == "Date of Inspection":
+            col_styles.append(repeat(date_style))
+        elif col == "Status":
+            plain = export_df["Status"].map(strip_status_emoji).str.lower()
+            col_styles.append(plain.map(status_styles).fillna(text_style).tolist())
+        else:
+            col_styles.append(repeat(text_style))
+
+    for values, row_styles in zip(zip(*columns), zip(*col_styles)):
+        ws.append([styled(v, s) for v, s in zip(values, row_styles)])
+
     buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        export_df.to_excel(writer, index=False, sheet_name=sheet_name)
-        ws = writer.sheets[sheet_name]
-
-        date_style = NamedStyle(name=f"date_style_{sheet_name}", number_format="DD-MM-YYYY")
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
+    wb.save(buf)
+    return buf.getvalue()
 
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True, vertical="top")
-                cell.border = thin_border
-
-        if "Date of Inspection" in export_df.columns:
-            date_col_idx = export_df.columns.get_loc("Date of Inspection") + 1
-            for row in ws.iter_rows(min_row=2, min_col=date_col_idx, max_col=date_col_idx,
-                                     max_row=len(export_df) + 1):
-                for cell in row:
-                    cell.style = date_style
-
-        for col in ws.columns:
-            max_length = 0
-            col_letter = col[0].column_letter
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except Exception:
-                    pass
-            ws.column_dimensions[col_letter].width = (max_length + 2) if max_length < 50 else 50
-
-        if "Status" in export_df.columns:
-            status_col_idx = export_df.columns.get_loc("Status") + 1
-            for row in ws.iter_rows(min_row=2, min_col=status_col_idx, max_col=status_col_idx,
-                                     max_row=len(export_df) + 1):
-                for cell in row:
-                    val = strip_status_emoji(cell.value).lower()
-                    if val == "pending":
-                        cell.font = Font(color="FF0000")  # Red
-                    elif val == "resolved":
-                        cell.font = Font(color="008000")  # Green
 
-    buf.seek(0)
-    return buf
+def frame_fingerprint(df):
+    """Stable content hash of a DataFrame (values, column names and order)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_excel_export(cache_key, _export_df, sheet_name):
+    """Workbook bytes memoized by (snapshot version, frame fingerprint); the
+    frame itself is excluded from Streamlit's argument hashing."""
+    return build_excel_export(_export_df, sheet_name)
+
+
+def excel_download_button(export_df, sheet_name, label, file_name, key):
+    """Download button whose workbook is only built once the user asks for it.
+
+    Until then a lightweight 'Prepare' button is shown; the prepared export
+    stays valid while the snapshot version and the exported rows are unchanged.
+    """
+    prepared = st.session_state.get(key)
+    cache_key = None
+    if prepared is not None:
+        cache_key = (st.session_state.snapshot.version, frame_fingerprint(export_df))
+        if prepared != cache_key:
+            prepared = None
+    if prepared is None:
+        if not st.button(f"⚙️ Prepare {label.replace('📥 ', '')}", key=f"{key}_prepare",
+                         use_container_width=True):
+            return
+        cache_key = cache_key or (st.session_state.snapshot.version, frame_fingerprint(export_df))
+        st.session_state[key] = cache_key
+    with st.spinner("Preparing Excel export..."):
+        data = cached_excel_export(cache_key, export_df, sheet_name)
+    st.download_button(
+        label,
+        data=data,
+        file_name=file_name,
+        mime=EXCEL_MIME,
+        use_container_width=True,
+        key=f"{key}_download",
+    )
 
 
 # =========================================================================
 # HELPERS — pie-chart breakdown (shared by Head / Sub Head distributions)
 # =========================================================================
-def render_pie_breakdown(df, group_col, chart_title, caption_parts, threshold=0.02):
-    """Pie chart with leader lines + labels, and a counts table on the right.
-    """
-    work = df.copy()
-    work[group_col] = work[group_col].fillna("").astype(str).str.strip()
-    work.loc[work[group_col] == "", group_col] = "(Blank)"
-
-    summary = (
-        work.groupby(group_col, sort=False)[group_col]
-        .count()
-        .reset_index(name="Count")
-        .sort_values(by="Count", ascending=False)
-        .reset_index(drop=True)
-    )
-    if summary.empty:
-        return
+CHART_CACHE_ENTRIES = 64
+CHART_RENDER_WORKERS = 2
+CHART_RENDER_QUEUE = 8            # renders queued or running before new ones are refused
+CHART_RENDER_TIMEOUT_SECONDS = 20
 
-    total = int(summary["Count"].sum())
-    summary["Percent"] = summary["Count"] / total
 
-    major = summary[summary["Percent"] >= threshold][[group_col, "Count"]].copy()
-    minor = summary[summary["Percent"] < threshold]
-    if not minor.empty:
-        major = pd.concat(
-            [major, pd.DataFrame([{group_col: "Others", "Count": int(minor["Count"].sum())}])],
-            ignore_index=True,
-        )
+def pie_breakdown_summary(df, group_col, threshold=0.02):
+    """Counts behind a pie breakdown, as plain lists.
 
-    base_colors = [
-        "#4E79A7", "#F28E2B", "#E15759", "#76B7B2", "#59A14F",
-        "#EDC948", "#B07AA1", "#FF9DA7", "#9C755F", "#BAB0AC",
-        "#1F77B4", "#FF7F0E", "#2CA02C", "#D62728", "#9467BD",
-        "#8C564B", "#E377C2", "#7F7F7F", "#BCBD22", "#17BECF",
-    ]
-    colors = [base_colors[i % len(base_colors)] for i in range(len(major))]
+    Returns (major, table_rows): `major` is [(name, count)] for the slices,
+    with groups under `threshold` of the total folded into "Others";
+    `table_rows` is every group plus a TOTAL row. Both are empty when `df` is.
+    """
+    names = df[group_col].astype(object).fillna("").astype(str).str.strip()
+    names = names.where(names != "", "(Blank)")
+    counts = names.value_counts(sort=False)
+    if counts.empty:
+        return [], []
+    counts = counts.iloc[np.argsort(-counts.to_numpy(), kind="stable")]
+
+    total = int(counts.sum())
+    share = counts / total
+    major = [(str(k), int(v)) for k, v in counts[share >= threshold].items()]
+    if (share < threshold).any():
+        major.append(("Others", int(counts[share < threshold].sum())))
 
     # Table rows: name + count only
-    table_rows = [[str(r[group_col]), int(r["Count"])] for _, r in summary.iterrows()]
+    table_rows = [[str(k), int(v)] for k, v in counts.items()]
     table_rows.append(["TOTAL", total])
+    return major, table_rows
 
-    # Layout: pie left (with room for labels), table right
-    fig = plt.figure(figsize=(12, 5.5), facecolor="white")
-    ax_pie = fig.add_axes([0.02, 0.12, 0.50, 0.78])
-    ax_tbl = fig.add_axes([0.58, 0.10, 0.40, 0.80])
-    ax_tbl.axis("off")
-
-    wedges, texts, autotexts = ax_pie.pie(
-        major["Count"].tolist(),
-        colors=colors,
-        startangle=90,
-        autopct="%1.1f%%",
-        pctdistance=0.55,
-        textprops=dict(color="black", fontsize=8),
-        wedgeprops=dict(edgecolor="white", linewidth=1.2),
-    )
-    for t in autotexts:
-        t.set_fontsize(8)
-        t.set_fontweight("bold")
-
-    # Leader lines + labels — alternate left/right around the pie
-    for i, (wedge, (_, row)) in enumerate(zip(wedges, major.iterrows())):
-        ang = (wedge.theta2 + wedge.theta1) / 2.0
-        x = np.cos(np.deg2rad(ang))
-        y = np.sin(np.deg2rad(ang))
-
-        # Prefer left side for labels so they stay away from the table
-        # but allow right-side labels only for slices clearly on the right
-        # and keep them close to the pie (short lines)
-        if x >= 0:
-            lx = 1.25
-            ha = "left"
-        else:
-            lx = -1.25
-            ha = "right"
-        ly = 1.15 * y
-
-        label = f"{row[group_col]} ({int(row['Count'])})"
-        ax_pie.annotate(
-            label,
-            xy=(0.92 * x, 0.92 * y),
-            xytext=(lx, ly),
-            ha=ha,
-            va="center",
-            fontsize=8,
-            bbox=dict(boxstyle="round,pad=0.25", facecolor="white", edgecolor="#AAAAAA", alpha=0.9),
-            arrowprops=dict(arrowstyle="-", color="#555555", lw=0.8,
-                            connectionstyle="arc3,rad=0"),
-        )
 
-    ax_pie.set_xlim(-1.7, 1.7)
-    ax_pie.set_ylim(-1.5, 1.5)
-    ax_pie.set_aspect("equal")
-
-    # Table
-    col_labels = [group_col, "Count"]
-    table = ax_tbl.table(
-        cellText=table_rows,
-        colLabels=col_labels,
-        loc="center",
-        cellLoc="left",
-    )
-    table.auto_set_font_size(False)
-    table.set_fontsize(9)
-    table.scale(1.05, 1.5)
-
-    n_data = len(table_rows) - 1  # exclude TOTAL
-    for j in range(2):
-        cell = table[(0, j)]
-        cell.set_facecolor("#1F4E79")
-        cell.set_text_props(color="white", fontweight="bold", fontsize=9, ha="center")
-
-    for i in range(1, n_data + 1):
-        alt = "#F5F7FA" if i % 2 == 0 else "#FFFFFF"
-        table[(i, 0)].set_facecolor(alt)
-        table[(i, 0)].set_text_props(ha="left", fontsize=9)
-        table[(i, 1)].set_facecolor(alt)
-        table[(i, 1)].set_text_props(ha="center", fontsize=9)
-
-    # TOTAL
-    last = n_data + 1
-    for j in range(2):
-        table[(last, j)].set_facecolor("#E8F0FE")
-        table[(last, j)].set_text_props(fontweight="bold", fontsize=9,
-                                        ha="center" if j == 1 else "left")
-
-    for i in range(last + 1):
-        table[(i, 0)].set_width(0.70)
-        table[(i, 1)].set_width(0.30)
-
-    for _k, cell in table.get_celld().items():
-        cell.set_edgecolor("#D0D7DE")
-        cell.set_linewidth(0.6)
-
-    fig.suptitle(chart_title, fontsize=14, fontweight="bold", y=0.97, color="#1A1A1A")
-    fig.text(0.5, 0.02, " | ".join(caption_parts), ha="center", fontsize=7.5, color="#666666")
+@st.cache_resource
+def get_chart_pool():
+    return ChartRenderPool(CHART_RENDER_WORKERS, CHART_RENDER_QUEUE, CHART_CACHE_ENTRIES)
 
-    buf = BytesIO()
-    plt.savefig(buf, format="png", dpi=160, bbox_inches="tight", facecolor="white")
-    buf.seek(0)
-    plt.close(fig)
 
-    st.image(buf)
-    st.download_button(
+def render_pie_breakdown(df, group_col, chart_title, caption_parts, threshold=0.02):
+    """Show a cached pie breakdown of `df` by `group_col` with a PNG download
+    and an on-demand SVG one."""
+    major, table_rows = pie_breakdown_summary(df, group_col, threshold)
+    if not table_rows:
+        return
+
+    pool = get_chart_pool()
+    chart = dict(major=major, table_rows=table_rows, group_col=group_col,
+                 chart_title=chart_title, caption_parts=list(caption_parts))
+    try:
+        png = pool.submit("pie_breakdown", fmt="png", **chart).result(timeout=CHART_RENDER_TIMEOUT_SECONDS)
+    except (RenderQueueFull, FuturesTimeoutError):
+        st.warning(f"📊 {chart_title} is still being drawn; it will appear on the next refresh.")
+        return
+    except Exception as e:
+        st.error(f"Could not draw {chart_title}: {e}")
+        return
+
+    st.image(png)
+    d1, d2 = st.columns(2)
+    stem = f"{group_col.lower().replace(' ', '_')}_distribution"
+    d1.download_button(
         f"📥 Download {chart_title} (PNG)",
-        data=buf,
-        file_name=f"{group_col.lower().replace(' ', '_')}_distribution.png",
+        data=png,
+        file_name=f"{stem}.png",
         mime="image/png",
         key=f"dl_{group_col}_{chart_title}",
         use_container_width=True,
     )
-
+    with d2:
+        svg_download_button(pool, chart, chart_title, f"{stem}.svg", key=f"dl_svg_{group_col}_{chart_title}")
+
+
+def svg_download_button(pool, chart, chart_title, file_name, key):
+    """SVG download that is only rendered once the user asks for it, like
+    excel_download_button(); the request holds while the chart is unchanged."""
+    chart_key = pool.key("pie_breakdown", dict(chart, fmt="svg"))
+    if st.session_state.get(key) != chart_key:
+        if not st.button(f"⚙️ Prepare {chart_title} (SVG)", key=f"{key}_prepare", use_container_width=True):
+            return
+        st.session_state[key] = chart_key
+    try:
+        svg = pool.submit("pie_breakdown", fmt="svg", **chart).result(timeout=CHART_RENDER_TIMEOUT_SECONDS)
+    except (RenderQueueFull, FuturesTimeoutError):
+        st.warning("The SVG is still being drawn; it will be ready on the next refresh.")
+        return
+    except Exception as e:
+        st.error(f"Could not draw the SVG: {e}")
+        return
+    st.download_button(
+        f"📥 Download {chart_title} (SVG)",
+        data=svg,
+        file_name=file_name,
+        mime="image/svg+xml",
+        key=f"{key}_download",
+        use_container_width=True,
+    )
 
 
 # =========================================================================
@@ -1356,36 +2988,307 @@ st.markdown(
 # =========================================================================
 # LOAD DATA
 # =========================================================================
-@st.cache_data(ttl=5)
-def load_data():
-    REQUIRED_COLS = [
-        "Date of Inspection", "Type of Inspection", "Location",
-        "Head", "Sub Head", "Deficiencies Noted",
-        "Inspection By", "Action By", "Feedback",
-        "User Feedback/Remark", TIMESTAMP_COL_NAME
-    ]
+REQUIRED_COLS = [
+    "Date of Inspection", "Type of Inspection", "Location",
+    "Head", "Sub Head", "Deficiencies Noted",
+    "Inspection By", "Action By", "Feedback",
+    "User Feedback/Remark", TIMESTAMP_COL_NAME
+]
+SNAPSHOT_TTL_SECONDS = 5
+
+
+def build_deficiency_frame(data, classifier=None):
+    """Turn get_all_values()-shaped rows into the app's deficiency table.
+    `classifier` defaults to the process-wide ClassificationCache."""
+    if not data or len(data) < 2:
+        return pd.DataFrame(columns=REQUIRED_COLS + [
+            "_sheet_row", "_original_sheet_index", "Status", "_row_version", "Location_kind"
+        ])
+    headers = [c.strip() for c in data[0]]
+    df = pd.DataFrame(data[1:], columns=headers)
+    for col in REQUIRED_COLS:
+        if col not in df.columns:
+            df[col] = ""
+    df["Date of Inspection"] = parse_sheet_dates(df["Date of Inspection"])
+    df["Location"] = canonicalize_locations(df["Location"])
+    df["_sheet_row"] = df.index + 2
+    df["_original_sheet_index"] = df.index
+    df["Status"] = (classifier or get_classification_cache()).classify(df["Feedback"], df["User Feedback/Remark"])
+    df["_row_version"] = row_versions(df)
+    df = apply_categorical_schema(df)
+    df["Location_kind"] = location_kinds(df["Location"])
+    return df
+
+
+class DataSnapshot:
+    """One versioned copy of the deficiency table, shared read-only by every
+    session. Nothing may modify `df` in place: tabs that need to add or change
+    columns take a copy of the columns they use first. `saved_at` is set when
+    the table was read back from the local snapshot file instead of the sheet."""
+
+    def __init__(self, version, df, saved_at=None):
+        self.version = version
+        self.df = df
+        self.saved_at = saved_at
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def derived(self, name, builder):
+        """Build `builder(df)` once per snapshot and share it, e.g. indexes."""
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self.df)
+            return self._derived[name]
+
+
+def save_snapshot_file(snapshot, path):
+    """Write the snapshot table as Parquet and its version to the JSON sidecar,
+    each through a temp file and rename so readers never see a torn file."""
+    snapshot.df.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+    meta = {
+        "schema": SNAPSHOT_CACHE_SCHEMA,
+        "version": snapshot.version,
+        "rows": len(snapshot.df),
+        "saved_at": datetime.now(pytz.timezone("Asia/Kolkata")).strftime("%d-%m-%Y %H:%M:%S"),
+    }
+    with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+
+
+def load_snapshot_file(path):
+    """The DataSnapshot saved by save_snapshot_file(), or None if there is none
+    or it is unreadable or from another schema."""
     try:
-        data = sheet.get_all_values()
-        if not data or len(data) < 2:
+        with open(f"{path}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("schema") != SNAPSHOT_CACHE_SCHEMA:
+            return None
+        df = pd.read_parquet(path, memory_map=True)
+    except Exception:
+        return None
+    if len(df) != meta.get("rows"):
+        return None   # Parquet and sidecar from different saves
+    return DataSnapshot(int(meta["version"]), df, saved_at=meta.get("saved_at"))
+
+
+class SnapshotStore:
+    """Holds the current DataSnapshot for the whole process. The sheet is
+    synced at most once per SNAPSHOT_TTL_SECONDS, and a new frame is built
+    only when the sync reports a new version.
+
+    With SNAPSHOT_CACHE_PATH set, every new snapshot is also saved to disk in a
+    background thread. After a restart the saved one is served at once while
+    the first sync runs in the background; sync versions continue from the
+    saved version so version-keyed caches never mix the two tables up.
+
+    Only one sync runs at a time (`_sync_lock`): a forced refresh waits for an
+    in-flight background refresh instead of racing it, and a result older than
+    the current snapshot is never installed.
+    """
+
+    def __init__(self, cache_path=None):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._cache_path = cache_path
+        self._refreshing = False
+        self._save_lock = threading.Lock()
+        self._save_thread = None
+        self._to_save = None
+        if cache_path:
+            self._snapshot = load_snapshot_file(cache_path)
+
+    def current(self, ws, force=False):
+        # Resolved on the calling (script) thread; the background refresh only
+        # ever receives them as arguments.
+        sync, classifier = get_deficiency_sync(), get_classification_cache()
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.saved_at and not force:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._background_refresh, args=(ws, sync, classifier),
+                        name="snapshot-refresh", daemon=True,
+                    ).start()
+                return self._snapshot
+            now = time.monotonic()
+            fresh = now - self._checked_at < SNAPSHOT_TTL_SECONDS
+            if self._snapshot is not None and fresh and not force:
+                return self._snapshot
+            with self._sync_lock:
+                self._snapshot = self._synced(ws, self._snapshot, sync, classifier)
+            self._checked_at = now
+            return self._snapshot
+
+    def _synced(self, ws, current, sync, classifier):
+        """Sync the sheet and return the snapshot matching it: `current` if
+        nothing changed, otherwise a newly built (and saved) one. Callers hold
+        `_sync_lock`."""
+        if current is not None and current.saved_at:
+            sync.version = max(sync.version, current.version)
+        sync.sync(ws)
+        if current is not None and current.version == sync.version:
+            return current
+        snapshot = DataSnapshot(sync.version, build_deficiency_frame(sync.values(), classifier))
+        self._save_in_background(snapshot)
+        return snapshot
+
+    def _background_refresh(self, ws, sync, classifier):
+        # Runs without the store lock, so sessions keep getting the saved
+        # table while the sheet downloads.
+        try:
+            with self._sync_lock:
+                snapshot = self._synced(ws, self._snapshot, sync, classifier)
+        except Exception:
+            snapshot = None  # keep serving the saved table; the next current() call retries
+        with self._lock:
+            self._refreshing = False
+            if snapshot is not None and (self._snapshot.saved_at or snapshot.version > self._snapshot.version):
+                self._snapshot = snapshot
+                self._checked_at = time.monotonic()
+
+    def _save_in_background(self, snapshot):
+        if not self._cache_path:
+            return
+        with self._save_lock:
+            self._to_save = snapshot
+            if self._save_thread is None:
+                self._save_thread = threading.Thread(target=self._save_loop, name="snapshot-save", daemon=True)
+                self._save_thread.start()
+
+    def _save_loop(self):
+        while True:
+            with self._save_lock:
+                snapshot, self._to_save = self._to_save, None
+                if snapshot is None:
+                    self._save_thread = None
+                    return
+            try:
+                save_snapshot_file(snapshot, self._cache_path)
+            except Exception:
+                pass  # e.g. read-only disk: warm starts are an optimization only
+
+
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore(SNAPSHOT_CACHE_PATH)
+
+
+def load_data(force=False):
+    try:
+        snapshot = get_snapshot_store().current(sheet, force=force)
+        if snapshot.df.empty:
             st.warning("No data found in Google Sheet. Returning empty DataFrame.")
-            return pd.DataFrame(columns=REQUIRED_COLS)
-        headers = [c.strip() for c in data[0]]
-        df = pd.DataFrame(data[1:], columns=headers)
-        for col in REQUIRED_COLS:
-            if col not in df.columns:
-                df[col] = ""
-        df["Date of Inspection"] = pd.to_datetime(df["Date of Inspection"], errors="coerce")
-        df["Location"] = df["Location"].astype(str).str.strip().str.upper()
-        df["_sheet_row"] = df.index + 2
-        return df
+        return snapshot
     except Exception as e:
         st.error(f"❌ Error loading Google Sheet: {str(e)}")
         st.warning("Returning empty DataFrame to prevent crashes.")
-        return pd.DataFrame(columns=REQUIRED_COLS)
+        return DataSnapshot(-1, build_deficiency_frame([]))
+
+
+# ---- Per-session view: shared snapshot + this session's own saved edits ----
+def pin_snapshot(snapshot):
+    """Point this session at `snapshot`, dropping overlay rows it already contains."""
+    overlay = st.session_state.df_overlay
+    if overlay and not snapshot.df.empty:
+        base = snapshot.df.set_index("_sheet_row")
+        for sheet_row in list(overlay):
+            if sheet_row in base.index and all(
+                str(base.at[sheet_row, c]) == str(v) for c, v in overlay[sheet_row].items()
+            ):
+                del overlay[sheet_row]
+    st.session_state.snapshot = snapshot
+    st.session_state.overlay_df = None
+
+
+def record_local_edits(edits):
+    """Remember rows this session just wrote ({sheet_row: {column: value}}) so
+    they show immediately, without waiting for the next snapshot."""
+    for sheet_row, values in edits.items():
+        st.session_state.df_overlay.setdefault(int(sheet_row), {}).update(values)
+    st.session_state.overlay_df = None
+
+
+def session_df():
+    """The table as this session sees it. Without local edits this is the
+    shared snapshot frame itself; with edits, a shallow copy where only the
+    edited columns are replaced."""
+    snapshot = st.session_state.snapshot
+    if snapshot is None:
+        return None
+    overlay = st.session_state.df_overlay
+    if not overlay or snapshot.df.empty:
+        return snapshot.df
+    if st.session_state.overlay_df is not None:
+        return st.session_state.overlay_df
+
+    df = snapshot.df.copy(deep=False)
+    edits = pd.DataFrame.from_dict(overlay, orient="index")
+    pos = pd.Index(df["_sheet_row"]).get_indexer(edits.index)
+    edits, pos = edits[pos >= 0], pos[pos >= 0]
+    for col in edits.columns:
+        if col not in df.columns:
+            continue
+        has_value = edits[col].notna().to_numpy()
+        df[col] = set_at_positions(df[col], pos[has_value], edits[col].to_numpy()[has_value])
+    df["Status"] = set_at_positions(
+        df["Status"], pos,
+        get_classification_cache().classify(df["Feedback"].iloc[pos], df["User Feedback/Remark"].iloc[pos]).to_numpy(),
+    )
+    df["_row_version"] = set_at_positions(df["_row_version"], pos, row_versions(df.iloc[pos]).to_numpy())
+    st.session_state.overlay_df = df
+    return df
+
 
+# A session started on the saved table moves to the live one once the
+# background refresh has produced it.
+if st.session_state.snapshot is None or st.session_state.snapshot.saved_at:
+    pin_snapshot(load_data())
 
-if st.session_state.df is None:
-    st.session_state.df = load_data()
+with st.sidebar.expander("📡 Sheet sync", expanded=False):
+    _sync_metrics = get_deficiency_sync().metrics
+    st.caption(
+        f"Last sync: {_sync_metrics['synced_at'] or 'never'} ({_sync_metrics['mode'] or '—'})  \n"
+        f"Rows fetched: {_sync_metrics['last_rows_fetched']:,} last / {_sync_metrics['rows_fetched']:,} total  \n"
+        f"Bytes fetched: {_sync_metrics['last_bytes_fetched']:,} last / {_sync_metrics['bytes_fetched']:,} total  \n"
+        f"API calls: {_sync_metrics['api_calls']:,}"
+    )
+    if SHEETS_BACKEND == "local":
+        _backend_metrics = get_sheets_client().metrics
+        st.caption(
+            f"Local backend: {_backend_metrics['calls']:,} calls, "
+            f"{_backend_metrics['throttled']:,} answered with 429"
+        )
+    if st.session_state.snapshot.saved_at:
+        st.caption(f"Showing the table saved at {st.session_state.snapshot.saved_at}; refreshing in the background.")
+
+if SHOW_STARTUP_PROFILE:
+    with st.sidebar.expander("⏱️ Startup profile", expanded=False):
+        st.caption(f"This run reached the main view in {(time.perf_counter() - _SCRIPT_START) * 1000:,.0f} ms.")
+        _timings = get_import_timings()
+        if _timings:
+            st.caption("First load in this process (lazy imports):")
+            st.dataframe(
+                pd.DataFrame({"Module": list(_timings), "ms": [round(v * 1000) for v in _timings.values()]}),
+                hide_index=True, use_container_width=True,
+            )
+        if st.button("Measure cold import times", key="profile_cold_imports"):
+            with st.spinner("Importing each dependency in a fresh interpreter..."):
+                st.session_state.cold_import_profile = {
+                    name: cold_import_seconds(name) for name in PROFILED_IMPORTS
+                }
+        if st.session_state.get("cold_import_profile"):
+            cold = st.session_state.cold_import_profile
+            st.dataframe(
+                pd.DataFrame({
+                    "Module": list(cold),
+                    "Cold import ms": [None if v is None else round(v * 1000) for v in cold.values()],
+                }),
+                hide_index=True, use_container_width=True,
+            )
 
 # =========================================================================
 # MAIN TABS
@@ -1393,23 +3296,11 @@ if st.session_state.df is None:
 tabs = st.tabs(["📝 View Records", "📊 Analytics", "📨 Inspections", " 💡Smart Analysis"])
 
 with tabs[0]:
-    df = st.session_state.df
+    df = session_df()
     if df is None or df.empty:
         st.warning("No data available. Please check Google Sheets connection or refresh.")
         st.stop()
 
-    for col in ["Type of Inspection", "Location", "Head", "Sub Head", "Deficiencies Noted",
-                "Inspection By", "Action By", "Feedback", "User Feedback/Remark"]:
-        if col not in df.columns:
-            df[col] = ""
-
-    df["Date of Inspection"] = pd.to_datetime(df["Date of Inspection"], errors="coerce")
-    df["_original_sheet_index"] = df.index
-    df["Status"] = df.apply(lambda r: classify_feedback(r["Feedback"], r.get("User Feedback/Remark", "")), axis=1)
-
-    start_date = df["Date of Inspection"].min() if not df["Date of Inspection"].isna().all() else pd.Timestamp.today()
-    end_date = df["Date of Inspection"].max() if not df["Date of Inspection"].isna().all() else pd.Timestamp.today()
-
     # Primary filters – these will stack on mobile via CSS
     c1, c2 = st.columns(2)
     c1.multiselect("Type of Inspection", VALID_INSPECTIONS, key="view_type_filter")
@@ -1422,22 +3313,21 @@ with tabs[0]:
 
     selected_status = st.selectbox("🔘 Status", ["All", "Pending", "Resolved"], key="view_status_filter")
 
-    filtered = df[(df["Date of Inspection"] >= start_date) & (df["Date of Inspection"] <= end_date)]
-
+    selections = {}
     if st.session_state.view_type_filter:
-        filtered = filtered[filtered["Type of Inspection"].isin(st.session_state.view_type_filter)]
-
+        selections["Type of Inspection"] = st.session_state.view_type_filter
     if st.session_state.view_location_filter:
-        filtered = filtered[filtered["Location"].isin(expand_locations(st.session_state.view_location_filter))]
-
+        selections["Location"] = expand_locations(st.session_state.view_location_filter)
     if st.session_state.view_head_filter:
-        filtered = filtered[filtered["Head"].isin(st.session_state.view_head_filter)]
-
+        selections["Head"] = st.session_state.view_head_filter
     if st.session_state.view_sub_filter:
-        filtered = filtered[filtered["Sub Head"].isin(st.session_state.view_sub_filter)]
-
+        selections["Sub Head"] = st.session_state.view_sub_filter
     if selected_status != "All":
-        filtered = filtered[filtered["Status"] == selected_status]
+        selections["Status"] = [selected_status]
+
+    # Rows without a parseable date never fall inside any date range
+    mask = indexed_filter_mask(df, selections) & df["Date of Inspection"].notna().to_numpy()
+    filtered = df[mask]
 
     filtered = apply_common_filters(filtered, prefix="view_")
     filtered = filtered.apply(lambda x: x.str.replace("\n", " ") if x.dtype == "object" else x)
@@ -1496,13 +3386,12 @@ with tabs[0]:
         "Deficiencies Noted", "Inspection By", "Action By", "Feedback", "User Feedback/Remark",
         "Status", TIMESTAMP_COL_NAME
     ]].copy()
-    export_df["Date of Inspection"] = pd.to_datetime(export_df["Date of Inspection"]).dt.date
-    st.download_button(
-        "📥 Export Filtered Records to Excel",
-        data=build_excel_export(export_df, "Filtered Records"),
+    export_df["Date of Inspection"] = export_df["Date of Inspection"].dt.date
+    excel_download_button(
+        export_df, "Filtered Records",
+        label="📥 Export Filtered Records to Excel",
         file_name="filtered_records.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        use_container_width=True,
+        key="export_filtered",
     )
 
     # ---------- EDITOR ----------
@@ -1529,15 +3418,13 @@ with tabs[0]:
         editable_df = editable_filtered[valid_cols + ["_original_sheet_index", "_sheet_row"]].copy()
 
         if "Date of Inspection" in editable_df.columns:
-            editable_df["Date of Inspection"] = pd.to_datetime(
-                editable_df["Date of Inspection"], errors="coerce"
-            ).dt.date
+            editable_df["Date of Inspection"] = editable_df["Date of Inspection"].dt.date
 
         if "Feedback" in editable_df.columns and "User Feedback/Remark" in editable_df.columns:
             editable_df.insert(
                 editable_df.columns.get_loc("User Feedback/Remark") + 1,
                 "Status",
-                [get_status(r["Feedback"], r["User Feedback/Remark"]) for _, r in editable_df.iterrows()]
+                editable_filtered["Status"]
             )
             # Keep a plain-text copy for exports (emoji version is display-only in the grid)
             editable_df["_status_plain"] = editable_df["Status"]
@@ -1545,11 +3432,18 @@ with tabs[0]:
 
         # ---- Global Search ----
         st.markdown("#### 🔍 Search and Filter")
-        search_text = st.text_input("Search All Columns (case-insensitive)", "").strip().lower()
+        s1, s2 = st.columns([4, 1])
+        search_text = normalize_search_query(s1.text_input("Search All Columns (case-insensitive)", ""))
+        word_start = s2.checkbox("Word starts only", key="search_word_start")
         if search_text:
-            mask = editable_df[valid_cols].astype(str).apply(
-                lambda col: col.str.contains(search_text, case=False, na=False)
-            ).any(axis=1)
+            search_index = st.session_state.snapshot.derived("search_index", SearchIndex)
+            mask = editable_df["_sheet_row"].isin(search_index.search(search_text, prefix=word_start))
+            # Rows edited in this session may no longer match what the index saw
+            edited = editable_df["_sheet_row"].isin(list(st.session_state.df_overlay))
+            if edited.any():
+                mask[edited] = match_search_text(
+                    search_text_of(editable_df[edited]), search_text, prefix=word_start
+                )
             editable_df = editable_df[mask].copy()
             st.info(f"Found {len(editable_df)} matching rows after search.")
 
@@ -1602,11 +3496,36 @@ with tabs[0]:
             editable_df = df_filtered
             st.info(f"Applied column filters → {len(editable_df)} rows remaining.")
 
+        # ---- Sorting and paging (done here; the grid only receives one page) ----
+        sort_labels = {"Sheet order": None, **{c: c for c in valid_cols}}
+        if "_status_plain" in editable_df.columns:
+            sort_labels["Status"] = "_status_plain"
+        p1, p2, p3 = st.columns([2, 1, 1])
+        sort_by = p1.selectbox("Sort by", list(sort_labels), key="grid_sort_by")
+        page_size = p2.selectbox("Rows per page", GRID_PAGE_SIZES, index=1, key="grid_page_size")
+        descending = p3.toggle("Descending", key="grid_sort_desc")
+
+        n_pages = max(1, -(-len(editable_df) // page_size))
+        if st.session_state.get("grid_page", 1) > n_pages:
+            st.session_state.grid_page = n_pages
+        page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1, key="grid_page")
+        order = grid_sort_order(editable_df, sort_labels[sort_by], descending)
+        page_base = editable_df.iloc[order[(page - 1) * page_size: page * page_size]]
+        page_df = page_base
+        dirty = st.session_state.grid_dirty
+        if dirty and "User Feedback/Remark" in page_df.columns:
+            page_df = page_base.copy()
+            page_dirty = page_df["_sheet_row"].map(dirty)
+            page_df["User Feedback/Remark"] = page_dirty.where(page_dirty.notna(), page_df["User Feedback/Remark"])
+
         # ---- AgGrid configuration ----
-        grid_display_df = editable_df.drop(columns=["_status_plain"], errors="ignore")
+        st_aggrid = _lazy_import("st_aggrid")
+        AgGrid, GridOptionsBuilder, JsCode = st_aggrid.AgGrid, st_aggrid.GridOptionsBuilder, st_aggrid.JsCode
+        grid_display_df = page_df.drop(columns=["_status_plain"], errors="ignore")
         gb = GridOptionsBuilder.from_dataframe(grid_display_df)
         gb.configure_default_column(
             editable=False,
+            sortable=False,        # sorting is applied to all rows above, not just this page
             wrapText=True,
             autoHeight=True,
             resizable=True,
@@ -1641,30 +3560,63 @@ with tabs[0]:
         grid_options = gb.build()
 
         st.markdown("#### 🚈 Inspection Details")
-        st.caption("Type your compliance in 'User Feedback/Remark' column. Use column headers to sort. On mobile you can scroll the grid horizontally.")
+        st.caption(
+            "Type your compliance in 'User Feedback/Remark' column; edits are kept across pages until you submit. "
+            "Use 'Sort by' above to sort. On mobile you can scroll the grid horizontally."
+        )
         grid_response = AgGrid(
             grid_display_df,
             gridOptions=grid_options,
-            update_mode=GridUpdateMode.VALUE_CHANGED,
+            update_on=["cellValueChanged"],
             height=500,                 # CSS will reduce this further on small screens
             allow_unsafe_jscode=True,
             fit_columns_on_grid_load=False,
             theme="streamlit",
+            key=f"deficiency_grid_{st.session_state.grid_nonce}_{sort_by}_{descending}_{page_size}_{page}",
         )
-        edited_df = pd.DataFrame(grid_response["data"])
 
-        # ---- Export edited grid (plain-text Status so colouring matches) ----
+        # ---- Collect edits into the session's dirty set ----
+        if "User Feedback/Remark" in page_df.columns:
+            saved = page_base.set_index("_sheet_row")["User Feedback/Remark"].fillna("").astype(str)
+            # The rows the grid returned are authoritative: they hold every edit
+            # made on this page, however many arrived in one rerun.
+            returned = pd.DataFrame(grid_response["data"])
+            changed = {}
+            if not returned.empty and {"_sheet_row", "User Feedback/Remark"} <= set(returned.columns):
+                changed = dict(zip(returned["_sheet_row"].astype(int), returned["User Feedback/Remark"]))
+            # The component repeats its last event on every rerun; apply each one once.
+            event = getattr(grid_response, "event_data", None) or {}
+            if event.get("type") == "cellValueChanged" and isinstance(event.get("data"), dict):
+                signature = (int(event["data"]["_sheet_row"]), event.get("oldValue"), event.get("newValue"))
+                if signature != st.session_state.grid_last_event:
+                    st.session_state.grid_last_event = signature
+                    changed[signature[0]] = event["data"].get("User Feedback/Remark")
+            changed = {r: v for r, v in changed.items() if r in saved.index}
+            for sheet_row, remark in changed.items():
+                remark = "" if remark is None else str(remark)
+                if remark == saved.get(sheet_row, ""):
+                    dirty.pop(sheet_row, None)
+                else:
+                    dirty[sheet_row] = remark
+            if dirty:
+                st.caption(f"✏️ {len(dirty)} unsaved edit(s).")
+
+        # ---- Export edited records: every filtered row, with unsaved edits ----
         export_cols = [c for c in valid_cols if c not in ["_original_sheet_index", "_sheet_row"]]
-        export_edited_df = edited_df[export_cols].copy()
-        export_edited_df["Status"] = edited_df["Status"].apply(strip_status_emoji)
+        export_source = editable_df.set_index("_sheet_row")
+        if dirty and "User Feedback/Remark" in export_cols:
+            edited_rows = export_source.index.intersection(list(dirty))
+            export_source.loc[edited_rows, "User Feedback/Remark"] = [dirty[r] for r in edited_rows]
+        export_edited_df = export_source[export_cols].reset_index(drop=True)
+        if "_status_plain" in export_source.columns:
+            export_edited_df["Status"] = export_source["_status_plain"].to_numpy()
         export_edited_df["Date of Inspection"] = pd.to_datetime(export_edited_df["Date of Inspection"]).dt.date
 
-        st.download_button(
+        excel_download_button(
+            export_edited_df, "Edited Records",
             label="📥 Export Edited Records to Excel",
-            data=build_excel_export(export_edited_df, "Edited Records"),
             file_name=f"edited_records_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True,
+            key="export_edited",
         )
 
         # ---- Buttons ----
@@ -1674,7 +3626,8 @@ with tabs[0]:
 
         if refresh_clicked:
             with st.spinner("🔄 Refreshing data from Google Sheets..."):
-                st.session_state.df = load_data()
+                pin_snapshot(load_data(force=True))
+            st.session_state.grid_nonce += 1
             st.success("✅ Data refreshed successfully!")
             st.rerun()
 
@@ -1684,43 +3637,25 @@ with tabs[0]:
             else:
                 st.session_state.feedback_submitting = True
                 try:
-                    with st.spinner("💾 Saving feedback to Google Sheet... Please do not refresh or close the page."):
-                        need_cols = {"_original_sheet_index", "User Feedback/Remark"}
-                        if not need_cols.issubset(edited_df.columns) or "Feedback" not in editable_filtered.columns:
+                    with st.spinner("💾 Queueing feedback for Google Sheet..."):
+                        if "User Feedback/Remark" not in editable_df.columns or "Feedback" not in filtered.columns:
                             st.error("⚠️ Required columns are missing from the data.")
+                        elif not dirty:
+                            st.info("ℹ️ No changes detected in the feedback.")
                         else:
-                            orig = editable_filtered.set_index("_original_sheet_index")
-                            new_df = edited_df.set_index("_original_sheet_index")
-
-                            old_remarks = orig["User Feedback/Remark"].fillna("").astype(str)
-                            new_remarks = new_df["User Feedback/Remark"].fillna("").astype(str)
-
-                            common_ids = new_remarks.index.intersection(old_remarks.index)
-                            diff_mask = new_remarks.loc[common_ids] != old_remarks.loc[common_ids]
-                            changed_ids = diff_mask[diff_mask].index.tolist()
-
-                            if changed_ids:
-                                diffs = new_df.loc[changed_ids].copy()
-                                diffs["_sheet_row"] = orig.loc[changed_ids, "_sheet_row"].values
-
-                                for oid in changed_ids:
-                                    user_remark = new_df.loc[oid, "User Feedback/Remark"].strip()
-                                    if not user_remark:
-                                        continue
-                                    # Copy the remark into Feedback and clear the remark field
-                                    diffs.at[oid, "Feedback"] = user_remark
-                                    diffs.at[oid, "User Feedback/Remark"] = ""
-                                    st.session_state.df.at[oid, "Feedback"] = user_remark
-                                    st.session_state.df.at[oid, "User Feedback/Remark"] = ""
-
-                                update_feedback_column(diffs.reset_index())
-                                st.success(f"✅ Successfully updated {len(changed_ids)} record(s)!")
-                            else:
-                                st.info("ℹ️ No changes detected in the feedback.")
+                            diffs = dirty_submission_frame(dirty, session_df())
+                            if update_feedback_column(diffs):
+                                dirty.clear()
+                                # New grid key: the old one would replay the submitted text
+                                st.session_state.grid_nonce += 1
+                                st.session_state.grid_last_event = None
                 except Exception as e:
                     st.error(f"❌ Error during submission: {str(e)}")
                 finally:
                     st.session_state.feedback_submitting = False
+
+        if st.session_state.pending_writes:
+            st.fragment(render_write_status, run_every=2)()
     else:
         st.info("No deficiencies available to update at the moment.")
 
@@ -1770,72 +3705,34 @@ with col2:
 # ANALYTICS TAB
 # =========================================================================
 with tabs[1]:
+    alt = _lazy_import("altair")
     st.markdown("### Total Deficiencies Trend (Bar + Trend Line)")
-    df = st.session_state.df.copy()
-
-    if "Status" not in df.columns:
-        df["Status"] = df.apply(
-            lambda r: classify_feedback(r["Feedback"], r.get("User Feedback/Remark", "")), axis=1
-        )
-    df["Status"] = df["Status"].fillna("Pending").replace({"": "Pending", "NA": "Pending"})
-    df["Status"] = df["Status"].str.strip().str.upper().map({
-        "PENDING": "Pending", "RESOLVED": "Resolved", "CLOSED": "Resolved"
-    }).fillna("Pending")
+    # Every count on this tab is read from the shared rollup cube
+    cube = analytics_cube()
 
-    if df.empty:
+    if cube.empty:
         st.info("No data available for analytics.")
     else:
-        df["Date of Inspection"] = pd.to_datetime(df["Date of Inspection"], errors="coerce")
-        df = df.dropna(subset=["Date of Inspection"])
-
-        min_date = df["Date of Inspection"].min().date()
-        max_date = df["Date of Inspection"].max().date()
+        min_date = cube["Day"].min().date()
+        max_date = cube["Day"].max().date()
         start_date, end_date = st.date_input(
             "Select Inspection Date Range",
             value=(min_date, max_date),
             min_value=min_date,
             max_value=max_date
         )
-        df = df[
-            (df["Date of Inspection"] >= pd.to_datetime(start_date)) &
-            (df["Date of Inspection"] <= pd.to_datetime(end_date))
-        ].copy()
-
-        def clean_name(text):
-            if pd.isna(text):
-                return "UNKNOWN"
-            s = str(text).strip()
-            s = re.sub(r"[\*\-\_\'\"]", "", s)
-            s = re.sub(r"\s+", " ", s).strip()
-            return s.upper()
-
-        df["Head_clean"] = df["Head"].apply(clean_name)
-        dept_map = {
-            "ENGINEERING": "ENGINEERING", "GSU": "GSU",
-            "ELECT/G": "ELECT/G", "ELECTG": "ELECT/G",
-            "ELECT/TRD": "ELECT/TRD", "ELECT/TRO": "ELECT/TRO",
-            "OPTG": "OPTG", "OPERATING": "OPTG",
-            "SIGNAL & TELECOM": "SIGNAL & TELECOM",
-            "MECHANICAL": "MECHANICAL", "COMMERCIAL": "COMMERCIAL",
-            "C&W": "C&W", "SECURITY": "SECURITY", "PERSONNEL": "PERSONNEL",
-            "MEDICAL": "MEDICAL", "FINANCE": "FINANCE", "STORE": "STORE",
-        }
-        df["Head_std"] = df["Head_clean"].map(dept_map).fillna("UNKNOWN")
-
-        if "Location" not in df.columns:
-            df["Location"] = ""
-        df["Location_clean"] = df["Location"].astype(str).apply(clean_name)
-        STATIONS_NORM = {clean_name(x) for x in STATION_LIST}
-        df["Is_Station"] = df["Location_clean"].isin(STATIONS_NORM)
+        cube = cube[
+            (cube["Day"] >= pd.to_datetime(start_date)) &
+            (cube["Day"] <= pd.to_datetime(end_date))
+        ]
 
-        all_locations = set(df["Location_clean"].dropna().unique())
-        for main_route, subsections in FOOTPLATE_ROUTE_HIERARCHY.items():
-            if main_route in all_locations:
-                all_locations.update(subsections)
-        df = df[df["Location_clean"].isin(all_locations)]
+        all_locations = expand_locations(cube["Location_clean"].unique())
 
         # ---- Trend chart ----
-        trend = df.groupby(pd.Grouper(key="Date of Inspection", freq="MS")).size().reset_index(name="TotalCount")
+        trend = (
+            cube.groupby(pd.Grouper(key="Day", freq="MS"))["Count"].sum()
+            .rename_axis("Date of Inspection").reset_index(name="TotalCount")
+        )
         trend = trend.dropna(subset=["Date of Inspection"])
 
         if not trend.empty:
@@ -1854,7 +3751,7 @@ with tabs[1]:
 
         # ---- Department summary (overall) ----
         st.markdown("### Department-wise **Total** Deficiencies Logged")
-        dept_counts = df.groupby("Head_std").size().reset_index(name="TotalCount") \
+        dept_counts = cube.groupby("Head_std")["Count"].sum().reset_index(name="TotalCount") \
             .sort_values("TotalCount", ascending=False)
         total_deficiencies = dept_counts["TotalCount"].sum()
         dept_counts["color"] = "#ff7f0e"
@@ -1877,11 +3774,11 @@ with tabs[1]:
 
         # ---- Top 3 stations ----
         st.markdown("### Top 3 Stations having most logged deficiencies")
-        station_df = df[df["Is_Station"]].copy()
+        station_df = cube[cube["Location_kind"] == "station"]
         if not station_df.empty:
             top3_stations = (
-                station_df.groupby("Location_clean")
-                .size()
+                station_df.groupby("Location_clean")["Count"]
+                .sum()
                 .reset_index(name="TotalCount")
                 .sort_values("TotalCount", ascending=False)
                 .head(3)
@@ -1909,17 +3806,17 @@ with tabs[1]:
         )
         if selected_locations:
             expanded_locations = expand_locations(selected_locations)
-            filtered = df[df["Location_clean"].isin(expanded_locations)].copy()
+            filtered = cube[cube["Location_clean"].isin(expanded_locations)]
 
             dept_breakdown = (
-                filtered.groupby("Head_std")
-                .size()
+                filtered.groupby("Head_std")["Count"]
+                .sum()
                 .reset_index(name="TotalCount")
                 .sort_values("TotalCount", ascending=False)
             )
             status_breakdown = (
-                filtered.groupby(["Head_std", "Status"])
-                .size()
+                filtered.groupby(["Head_std", "Status"])["Count"]
+                .sum()
                 .unstack(fill_value=0)
             )
             status_breakdown.columns = [f"{col}Count" for col in status_breakdown.columns]
@@ -2102,6 +3999,8 @@ with tabs[2]:
                                     key=f"insp_dl_{g_name}_{g_phone}_{g_date}",
                                 )
 with tabs[3]:
+    px = _lazy_import("plotly.express")
+    go = _lazy_import("plotly.graph_objects")
     # ============================================================
     # GOOGLE SHEET CONFIGURATION
     # ============================================================
@@ -2236,6 +4135,26 @@ with tabs[3]:
     # ============================================================
     # LOAD DATA FROM GOOGLE SHEET
     # ============================================================
+    def smart_analysis_column(name):
+        """The name preprocess_data() normalizes a sheet header to, or None for
+        columns Smart Analysis never reads (CRITICAL: never map Action By → Head)."""
+        cl = str(name).strip().lower()
+        if "date" in cl and "inspection" in cl:
+            return "Date of Inspection"
+        if cl in ["sub head", "subhead", "sub_head"]:
+            return "Sub Head"
+        if cl in ["location", "loc"]:
+            return "Location"
+        if cl in ["head", "department", "dept"]:
+            return "Head"
+        if cl in ["action by", "action_by", "actionby"]:
+            return "Action By"
+        if "feedback" in cl or "remark" in cl or "response" in cl:
+            return "User Remark" if "user" in cl or "officer" in cl else "Feedback"
+        if cl == "status":
+            return "Status"
+        return None
+
     @st.cache_data(ttl=60)
     def load_google_sheet(sheet_id: str, sheet_name: str):
         """Load sheet the same reliable way as the main app (service account first).
@@ -2244,29 +4163,23 @@ with tabs[3]:
         """
         if not sheet_id or not sheet_name:
             return None
-        # 1) Prefer service account (identical path to connect_to_gsheet / load_data)
+        # 1) Prefer service account (same pooled client as connect_to_gsheet / load_data),
+        #    fetching only the columns smart_analysis_column() recognises
         try:
-            service_account_info = dict(st.secrets["gcp_service_account"])
-            if "private_key" in service_account_info:
-                service_account_info["private_key"] = service_account_info["private_key"].replace("\\n", "\n")
-            scopes = [
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive",
-            ]
-            creds = Credentials.from_service_account_info(service_account_info, scopes=scopes)
-            gc = gspread.authorize(creds)
-            ws = gc.open_by_key(sheet_id).worksheet(sheet_name)
-            data = ws.get_all_values()
-            if not data or len(data) < 2:
+            ws = get_sheets_client().worksheet(sheet_id, sheet_name)
+            projection = get_column_projection(
+                f"smart_analysis:{sheet_id}:{sheet_name}",
+                lambda name: smart_analysis_column(name) is not None,
+            )
+            names, _, rows = projection.fetch(ws)
+            if len(rows) == 0:
                 return pd.DataFrame()
-            headers = [str(c).strip() for c in data[0]]
-            df = pd.DataFrame(data[1:], columns=headers)
-            return df
+            return pd.DataFrame(rows, columns=names)
         except Exception as e1:
             # 2) Fallback: public CSV export (only works if sheet is shared publicly)
             try:
                 url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}"
-                df = pd.read_csv(url)
+                df = pd.read_csv(url, usecols=lambda c: smart_analysis_column(c) is not None)
                 return df
             except Exception as e2:
                 st.error(
@@ -2296,7 +4209,10 @@ with tabs[3]:
         }
         return aliases.get(s, s)
 
-    def preprocess_data(df: pd.DataFrame, date_from: date, date_to: date, department: str):
+    def preprocess_data(df: pd.DataFrame, date_from: date, date_to: date, department: str,
+                        status_ready: bool = False):
+        """status_ready: `df` already carries the Status column attached by
+        load_data, so it is reused instead of classifying the rows again."""
         df = df.copy()
         debug = {}  # row counts after each stage (shown in UI)
 
@@ -2305,24 +4221,9 @@ with tabs[3]:
         # --------------------------------------------------------
         col_map = {}
         for c in df.columns:
-            cl = str(c).strip().lower()
-            if "date" in cl and "inspection" in cl:
-                col_map[c] = "Date of Inspection"
-            elif cl in ["sub head", "subhead", "sub_head"]:
-                col_map[c] = "Sub Head"
-            elif cl in ["location", "loc"]:
-                col_map[c] = "Location"
-            elif cl in ["head", "department", "dept"]:
-                col_map[c] = "Head"
-            elif cl in ["action by", "action_by", "actionby"]:
-                col_map[c] = "Action By"
-            elif "feedback" in cl or "remark" in cl or "response" in cl:
-                if "user" in cl or "officer" in cl:
-                    col_map[c] = "User Remark"
-                else:
-                    col_map[c] = "Feedback"
-            elif cl == "status":
-                col_map[c] = "Status"
+            target = smart_analysis_column(c)
+            if target is not None:
+                col_map[c] = target
 
         # Avoid duplicate target names if both Head and Action By existed
         # and somehow collided (should not happen after the fix above)
@@ -2353,15 +4254,8 @@ with tabs[3]:
         # --------------------------------------------------------
         # 3. Date filter
         # --------------------------------------------------------
-        df["Date of Inspection"] = pd.to_datetime(
-            df["Date of Inspection"], errors="coerce", dayfirst=True
-        )
-        # Also try non-dayfirst for any remaining NaT (e.g. YYYY-MM-DD)
-        still_nat = df["Date of Inspection"].isna()
-        if still_nat.any():
-            df.loc[still_nat, "Date of Inspection"] = pd.to_datetime(
-                df.loc[still_nat, "Date of Inspection"], errors="coerce", dayfirst=False
-            )
+        # Already datetime64 when the caller parsed it (or it came from load_data)
+        df["Date of Inspection"] = parse_sheet_dates(df["Date of Inspection"], dayfirst=True)
         df = df.dropna(subset=["Date of Inspection"])
         debug["after_date_parse"] = len(df)
 
@@ -2374,7 +4268,7 @@ with tabs[3]:
 
         # Clean text columns
         df["Sub Head"] = df["Sub Head"].fillna("").astype(str).str.strip()
-        df["Location"] = df["Location"].fillna("").astype(str).str.strip().str.upper()
+        df["Location"] = canonicalize_locations(df["Location"])
 
         # --------------------------------------------------------
         # 4. FILTER BY HEAD = department  (robust matching)
@@ -2411,13 +4305,14 @@ with tabs[3]:
         feedback_col = "Feedback" if "Feedback" in df.columns else None
         remark_col = "User Remark" if "User Remark" in df.columns else None
     
-        if feedback_col or remark_col:
-            statuses = []
-            for _, row in df.iterrows():
-                fb = row.get(feedback_col, "") if feedback_col else ""
-                rm = row.get(remark_col, "") if remark_col else ""
-                statuses.append(classify_feedback(fb, rm))
-            df["Status"] = statuses
+        if status_ready and "Status" in df.columns:
+            df["Status"] = df["Status"].fillna("Pending").astype(str)
+        elif feedback_col or remark_col:
+            blank = pd.Series("", index=df.index, dtype=object)
+            df["Status"] = get_classification_cache().classify(
+                df[feedback_col] if feedback_col else blank,
+                df[remark_col] if remark_col else blank,
+            )
         else:
             if "Status" not in df.columns:
                 df["Status"] = "Pending"
@@ -2455,8 +4350,9 @@ with tabs[3]:
     # same service-account path). This avoids a second, historically buggy
     # loader that preferred the public CSV export and mapped "Action By" → "Head".
     raw_df = None
-    if st.session_state.get("df") is not None and not st.session_state.df.empty:
-        raw_df = st.session_state.df.copy()
+    raw_from_session = session_df() is not None and not session_df().empty
+    if raw_from_session:
+        raw_df = session_df()  # preprocess_data() copies before changing anything
         st.caption("📡 Using data already loaded by the main app (most reliable).")
     else:
         with st.spinner("Loading data from Google Sheet..."):
@@ -2473,7 +4369,10 @@ with tabs[3]:
             break
     if _date_col is None:
         _date_col = raw_df.columns[0]
-    _all_dates = pd.to_datetime(raw_df[_date_col], errors="coerce", dayfirst=True).dropna()
+    if not is_datetime64_any_dtype(raw_df[_date_col]):
+        raw_df = raw_df.copy()
+        raw_df[_date_col] = parse_sheet_dates(raw_df[_date_col], dayfirst=True)
+    _all_dates = raw_df[_date_col].dropna()
     if not _all_dates.empty:
         _default_from, _default_to = _all_dates.min().date(), _all_dates.max().date()
     else:
@@ -2499,7 +4398,7 @@ with tabs[3]:
         st.error("From date cannot be after To date.")
         st.stop()
 
-    df = preprocess_data(raw_df, date_from, date_to, department)
+    df = preprocess_data(raw_df, date_from, date_to, department, status_ready=raw_from_session)
     debug_info = getattr(df, "attrs", {}).get("debug", {})
 
     if df.empty: